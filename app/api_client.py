@@ -1,5 +1,12 @@
 import requests # type: ignore
+from requests.adapters import HTTPAdapter # type: ignore
+from collections import OrderedDict
+from threading import Lock
+import math
 import os
+import time
+import uuid
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -7,39 +14,212 @@ dotenv_path = Path(__file__).parent.parent / ".user"
 load_dotenv(dotenv_path)
 
 BACKEND_URL = "http://localhost:8000"
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+TIMEOUT = (3.05, 10)  # (connect, read) seconds; nothing here should hang the GUI or the monitor
+CLIENT_ID = uuid.uuid4().hex  # Identifies this app to the backend, so its own broadcasts aren't echoed back
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# One keep-alive connection pool for every call to the backend and to Spotify
+session = _new_session()
+
+class RateLimitedError(Exception):
+    """Raised when Spotify answers 429; `retry_after` is the wait it asked for."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited by Spotify. Retry after {retry_after} seconds.")
+        self.retry_after = retry_after
+
+def _retry_after(value, default=60):
+    """Seconds to wait from a Retry-After header (delay seconds or an HTTP date)."""
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+        return max(seconds, 0) if math.isfinite(seconds) else default
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError, IndexError):
+        return default
+
+class TokenRefreshError(Exception):
+    """Raised when the backend couldn't refresh the tokens (or there is no refresh token)."""
+
+class SpotifySession:
+    def __init__(self, http=session, api_url=SPOTIFY_API_URL, timeout=TIMEOUT, etag_cache_size=128):
+        """
+        Spotify Web API client shared by the GUI and the background components.
+
+        Requests reuse the module's keep-alive session and always carry a
+        timeout. A 401 fetches a fresh token from the backend (asking it to
+        refresh first if it hands back the rejected one) and retries once.
+        GET responses with an ETag are cached, and later GETs of the same
+        URL send If-None-Match so an unchanged resource costs a 304.
+
+        Args:
+            http (requests.Session): Session to send requests through.
+            api_url (str): Base URL of the Web API.
+            timeout (tuple): (connect, read) timeout in seconds.
+            etag_cache_size (int): Most responses kept for conditional requests.
+        """
+        self.http = http
+        self.api_url = api_url
+        self.timeout = timeout
+        self.etag_cache_size = etag_cache_size
+        self._token = os.getenv("ACCESS_TOKEN")
+        self._token_lock = Lock()
+        self._etags = OrderedDict()  # url -> (etag, body)
+        self._etags_lock = Lock()  # The GUI, the monitor and the queue threads share this session
+
+    def access_token(self):
+        """The token requests are sent with, fetched from the backend if none is known yet."""
+        with self._token_lock:
+            if not self._token:
+                self._token = get_token_info().get("token")
+            return self._token
+
+    def _renew_token(self, rejected):
+        with self._token_lock:
+            if self._token != rejected:  # Another thread already renewed it
+                return
+            token = get_token_info().get("token")
+            if token == rejected:
+                # The backend still thinks it's valid (revoked, or clock skew), so make it refresh anyway
+                refresh_tokens(force=True)
+                token = get_token_info().get("token")
+            if token == rejected:
+                raise TokenRefreshError("Spotify rejected the access token and the backend couldn't replace it.")
+            self._token = token
+
+    def request(self, method, path, headers=None, **kwargs):
+        """
+        Send a request to the Web API and return the response.
+
+        Raises RateLimitedError on 429; other error statuses are left to the caller.
+        """
+        url = path if path.startswith("http") else f"{self.api_url}{path}"
+        for attempt in range(2):
+            token = self.access_token()
+            response = self.http.request(
+                method,
+                url,
+                headers={"Authorization": f"Bearer {token}", **(headers or {})},
+                timeout=self.timeout,
+                **kwargs,
+            )
+            if response.status_code != 401 or attempt:
+                break
+            self._renew_token(token)
+
+        if response.status_code == 429:
+            raise RateLimitedError(_retry_after(response.headers.get("Retry-After")))
+        return response
+
+    def get_json(self, path, params=None):
+        """GET a Web API resource as parsed JSON (None for 204 No Content), using ETags when offered."""
+        url = requests.Request("GET", path if path.startswith("http") else f"{self.api_url}{path}", params=params).prepare().url
+        with self._etags_lock:
+            cached = self._etags.get(url)
+        response = self.request("GET", url, headers={"If-None-Match": cached[0]} if cached else None)
+        if response.status_code == 304 and cached:
+            with self._etags_lock:
+                if url in self._etags:
+                    self._etags.move_to_end(url)
+            return cached[1]
+        response.raise_for_status()
+        if response.status_code == 204 or not response.content:
+            return None
+
+        data = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            with self._etags_lock:
+                self._etags[url] = (etag, data)
+                self._etags.move_to_end(url)
+                if len(self._etags) > self.etag_cache_size:
+                    self._etags.popitem(last=False)
+        return data
+
+spotify = SpotifySession()
 
 def get_login_url():
     """Fetch the login URL from the backend."""
-    response = requests.get(f"{BACKEND_URL}/login")
+    response = session.get(f"{BACKEND_URL}/login", timeout=TIMEOUT)
     print(f"Response Status Code: {response.status_code}")
     print(f"Response Text: {response.text}")  # Log raw response for debugging
     response.raise_for_status()
     return response.json().get("auth_url")
 
 
-def refresh_tokens():
-    """Refresh tokens using the backend."""
+def refresh_tokens(force=False):
+    """Refresh tokens using the backend; `force` refreshes even if it thinks they're still valid.
+
+    Raises TokenRefreshError if that fails.
+    """
     refresh_token = os.getenv("REFRESH_TOKEN")
     if not refresh_token:
-        raise Exception("Refresh token not found in .user file.")
+        raise TokenRefreshError("Refresh token not found in .user file.")
 
-    response = requests.post(f"{BACKEND_URL}/refresh", json={"refresh_token": refresh_token})
+    try:
+        response = session.post(
+            f"{BACKEND_URL}/refresh", params={"force": "true"} if force else None,
+            json={"refresh_token": refresh_token}, timeout=TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise TokenRefreshError(f"Token refresh failed: {e}") from e
+
+def start_queue(uris=None, use_preferences=True, shuffle=None, repeat=None, offset=0, position_ms=None):
+    """Start playback of a batch of tracks (by default the saved boost list) in one backend call."""
+    payload = {
+        "uris": uris or [],
+        "use_preferences": use_preferences,
+        "shuffle": shuffle,
+        "repeat": repeat,
+        "offset": offset,
+        "position_ms": position_ms,
+    }
+    response = session.post(f"{BACKEND_URL}/queue", json=payload, timeout=TIMEOUT)
     response.raise_for_status()
     return response.json()
 
-def validate_access_token():
-    """Check if the access token is valid."""
-    access_token = os.getenv("ACCESS_TOKEN")
-    if not access_token:
-        return False
+def get_token_info():
+    """Fetch the current access token and its expiry (epoch seconds) from the backend."""
+    response = session.get(f"{BACKEND_URL}/access_token", timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.json()
 
-    headers = {"Authorization": f"Bearer {access_token}"}
-    url = "https://api.spotify.com/v1/me"  # Endpoint to fetch user profile
+def notify_schedule_change(schedule):
+    """Broadcast a saved playback schedule to other clients through the backend."""
+    response = session.post(
+        f"{BACKEND_URL}/schedule", json=schedule, headers={"X-Client-Id": CLIENT_ID}, timeout=TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
 
-    response = requests.get(url, headers=headers)
-    if response.status_code == 401:  # Unauthorized
+def validate_access_token():
+    """Check if the access token is valid (after one refresh-and-retry)."""
+    try:
+        spotify.get_json("/me")  # Endpoint to fetch user profile
+    except requests.HTTPError as e:
+        if e.response is None or not e.response.url.startswith(spotify.api_url):
+            return False  # The backend failed to hand out a token (e.g. /access_token answered 500)
+        if e.response.status_code == 401:  # Unauthorized
+            return False
+        raise
+    except requests.RequestException:  # Backend down, so no token to validate with
+        return False
+    except TokenRefreshError as e:  # The token was rejected and couldn't be renewed
+        print(e)
         return False
-    response.raise_for_status()
     return True
 
 
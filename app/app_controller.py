@@ -2,18 +2,21 @@ import sys
 from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QMessageBox # type: ignore
 from PyQt5.QtGui import QIcon # type: ignore
 from ui import MainWindow
-import pandas as pd # type: ignore
-from api_client import get_login_url, refresh_tokens
-from machinelearning.model_training import train_and_evaluate_model, load_and_prepare_data, save_model
+from api_client import get_login_url, refresh_tokens, notify_schedule_change, get_token_info, start_queue, CLIENT_ID
+from machinelearning.model_registry import ModelRegistry
+from machinelearning.training_job import run_training_job
+from machinelearning.activity_db import upgrade
+from machinelearning.listening_stats import open_stats, boost_progress, StatsUnavailableError
 from PyQt5.QtCore import QThread, pyqtSignal, QTimer # type: ignore
-from datetime import datetime, timedelta
+from datetime import datetime
 from api_client import validate_access_token
 import webbrowser
 import websocket # type: ignore
 import time
 from threading import Thread
+import multiprocessing
+import queue
 from dotenv import load_dotenv
-import joblib # type: ignore
 from pathlib import Path
 import os
 from plyer import notification # type: ignore
@@ -24,17 +27,30 @@ dotenv_path = Path(__file__).parent.parent / ".user"
 load_dotenv(dotenv_path)
 
 class WebSocketClient(QThread):
-    reload_signal = pyqtSignal(str)  # Signal to notify the GUI of updates
+    reload_signal = pyqtSignal(dict)  # Signal to notify the GUI of updates
+    schedule_signal = pyqtSignal(dict)  # Schedule saved by another client
 
     def run(self):
         """Run the WebSocket listener in a thread."""
         def on_message(ws, message):
-            if message == "reload_env":
-                # Reload environment variables and emit the new access token
-                load_dotenv(dotenv_path)
-                access_token = os.getenv("ACCESS_TOKEN")
-                print(f"New access token received: {access_token}")
-                self.reload_signal.emit(access_token)
+            try:
+                event = json.loads(message)
+            except ValueError:
+                print(f"Ignoring unexpected WebSocket message: {message}")
+                return
+
+            if event.get("topic") == "schedule_change" and event.get("data"):
+                self.schedule_signal.emit(event["data"])
+
+            if event.get("topic") == "token_update":
+                # Ask the backend for the new token instead of re-reading the .user file
+                try:
+                    token_info = get_token_info()
+                except Exception as e:
+                    print(f"Error fetching updated token: {e}")
+                    return
+                print("New access token received.")
+                self.reload_signal.emit(token_info)
             
                 # Send desktop notification
                 notification.notify(
@@ -45,8 +61,12 @@ class WebSocketClient(QThread):
 
         while True:
             try:
-                ws_url = "ws://localhost:8000/ws"  # WebSocket server URL
-                ws = websocket.WebSocketApp(ws_url, on_message=on_message)
+                ws_url = f"ws://localhost:8000/ws?client_id={CLIENT_ID}"  # WebSocket server URL
+                ws = websocket.WebSocketApp(
+                    ws_url,
+                    on_message=on_message,
+                    on_open=lambda ws: ws.send(json.dumps({"subscribe": ["token_update", "schedule_change"]})),
+                )
                 ws.run_forever()
             except Exception as e:
                 print(f"WebSocket error: {e}. Retrying in 5 seconds...")
@@ -63,12 +83,85 @@ class LoginThread(QThread):
         except Exception as e:
             self.login_complete.emit(f"Error: {str(e)}")
 
+class DatabaseUpgradeThread(QThread):
+    finished_signal = pyqtSignal(str)  # Error message, empty on success
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+
+    def run(self):
+        """Run pending schema migrations (and the rollup rebuild) off the GUI thread."""
+        try:
+            upgrade(self.db_path)
+            self.finished_signal.emit("")
+        except Exception as e:
+            self.finished_signal.emit(str(e))
+
+class TrainingThread(QThread):
+    progress_signal = pyqtSignal(str, float)  # Stage and fraction done
+    metrics_signal = pyqtSignal(dict)  # Evaluation metrics of the trained model
+    trained_signal = pyqtSignal(object)  # (model, label_encoder)
+    failed_signal = pyqtSignal(str)
+    cancelled_signal = pyqtSignal()
+
+    cancel_grace_period = 10  # Seconds to wait for a cooperative stop before killing the process
+
+    def __init__(self):
+        super().__init__()
+        # Forking a process that has Qt threads running isn't safe, so always spawn
+        self.context = multiprocessing.get_context("spawn")
+        self.cancel_event = self.context.Event()
+        self.cancel_requested_at = None
+
+    def cancel(self):
+        """Ask the training process to stop at its next checkpoint."""
+        self.cancel_event.set()
+        self.cancel_requested_at = time.time()
+
+    def run(self):
+        """Run one training job in a child process and relay its events as signals."""
+        events = self.context.Queue()
+        process = self.context.Process(target=run_training_job, args=(events, self.cancel_event), daemon=True)
+        process.start()
+        try:
+            while True:
+                try:
+                    kind, payload = events.get(timeout=0.5)
+                except queue.Empty:
+                    if not process.is_alive():
+                        self.failed_signal.emit(f"Training process exited with code {process.exitcode}")
+                        return
+                    if self.cancel_requested_at and time.time() - self.cancel_requested_at > self.cancel_grace_period:
+                        # Still loading data; the export and feature store pick up where they stopped
+                        process.terminate()
+                        self.cancelled_signal.emit()
+                        return
+                    continue
+
+                if kind == "progress":
+                    self.progress_signal.emit(*payload)
+                elif kind == "metrics":
+                    self.metrics_signal.emit(payload)
+                elif kind == "finished":
+                    self.trained_signal.emit(payload)
+                    return
+                elif kind == "failed":
+                    self.failed_signal.emit(payload)
+                    return
+                elif kind == "cancelled":
+                    self.cancelled_signal.emit()
+                    return
+        finally:
+            process.join(timeout=5)
+
 class AppController:
     def __init__(self):
         self.app = QApplication(sys.argv)
         self.window = MainWindow()
 
         # Check and refresh tokens at startup
+        self.token_expires_at = None  # Epoch seconds, from the backend
         self.check_and_refresh_tokens()
 
         # Connect buttons
@@ -78,6 +171,7 @@ class AppController:
         # WebSocket Client
         self.websocket_client = WebSocketClient()
         self.websocket_client.reload_signal.connect(self.update_access_token)
+        self.websocket_client.schedule_signal.connect(self.apply_remote_schedule)
         self.websocket_client.start()
 
         # System Tray Integration
@@ -91,6 +185,18 @@ class AppController:
         self.window.add_song_button.clicked.connect(self.add_song)
         self.window.save_preferences_button.clicked.connect(self.save_preferences)
 
+        # Wrapped progress of the boost list, read from the activity rollups
+        self.activity_db_path = "machinelearning/activity_log.db"
+        self.window.refresh_progress_button.clicked.connect(self.refresh_progress)
+        self.progress_timer = QTimer()
+        self.progress_timer.timeout.connect(self.refresh_progress)
+        self.progress_timer.start(60000)  # Rollups are cheap to read; update every minute
+        # Migrating a large log can take minutes, so progress is first shown once it's done
+        self.upgrade_thread = DatabaseUpgradeThread(self.activity_db_path)
+        self.upgrade_thread.finished_signal.connect(self.on_database_upgraded)
+        if os.path.exists(self.activity_db_path):
+            self.upgrade_thread.start()
+
         # Tray Menu
         self.tray_menu = QMenu()
         self.show_action = self.tray_menu.addAction("Show App")
@@ -108,8 +214,6 @@ class AppController:
         self.token_expiry_timer.timeout.connect(self.update_token_expiry)
         self.token_expiry_timer.start(1000)  # Update every second
 
-        self.refresh_threshold = timedelta(minutes=5)
-
         # Connect playback controls
         self.window.play_button.clicked.connect(self.play_song)
         self.window.pause_button.clicked.connect(self.pause_song)
@@ -126,15 +230,24 @@ class AppController:
         self.is_playing = False  # Tracks if playback is running
 
          # Connect Machine Learning buttons
+        self.training_thread = None  # Current background training job
+        self.training_pending = False  # Another run was requested while one was going
         self.window.start_training_button.clicked.connect(self.start_training)
+        self.window.cancel_training_button.clicked.connect(self.cancel_training)
         self.window.create_model_button.clicked.connect(self.create_model)
 
         # Connect Prediction button
         self.window.start_prediction_button.clicked.connect(self.start_prediction)
 
-        # Load trained model (initially None)
+        # Trained model waiting to be saved (initially None)
         self.model = None
         self.label_encoder = None
+        self.training_metrics = {}
+
+        # Saved model versions; the active one stays loaded between predictions
+        self.model_registry = ModelRegistry(
+            "machinelearning/saved_models/registry", "machinelearning/saved_models/activity_model.pkl"
+        )
         
     def check_and_refresh_tokens(self):
         """Check and refresh tokens at startup."""
@@ -147,6 +260,7 @@ class AppController:
 
             # Attempt to refresh tokens
             refresh_tokens()
+            self.token_expires_at = get_token_info().get("expires_at")
             print("Tokens refreshed successfully.")
         except Exception as e:
             print(f"Error refreshing tokens: {e}")
@@ -202,55 +316,24 @@ class AppController:
             )
 
 
-    def update_access_token(self, token):
+    def update_access_token(self, token_info):
         """Update the GUI with the new access token."""
+        self.token_expires_at = token_info.get("expires_at")
         self.window.token_label.setText("Token Status: Logged In")
 
     
     def update_token_expiry(self):
-        """Update the token expiry label dynamically and refresh tokens if needed."""
+        """Update the token status label; the backend refreshes the token itself and broadcasts token_update."""
         try:
-            expires_in = os.getenv("EXPIRES_IN")
-            if expires_in:
-                token_expiry_time = datetime.now() + timedelta(seconds=int(expires_in))
-                time_remaining = token_expiry_time - datetime.now()
-
-                # if time_remaining.total_seconds() > 0:
-                #     print(f"Token Expires In: {str(time_remaining).split('.')[0]}")
-                # else:
-                #     print("Token Expired")
-                
-                # Auto-refresh token if within the threshold
-                if time_remaining <= self.refresh_threshold:
-                    self.auto_refresh_tokens()
+            if self.token_expires_at:
+                time_remaining = datetime.fromtimestamp(self.token_expires_at) - datetime.now()
+                if time_remaining.total_seconds() <= 0:
+                    self.window.token_label.setText("Token Status: Expired, waiting for the backend to refresh")
             else:
                 self.window.token_label.setText("Token Expiry Unknown")
         except Exception as e:
             print(f"Error updating token expiry: {e}")
 
-    def auto_refresh_tokens(self):
-        """Automatically refresh the token before it expires."""
-        try:
-            print("Token is nearing expiry. Refreshing tokens...")
-            tokens = refresh_tokens()  # Call the API client to refresh tokens
-            load_dotenv(dotenv_path)  # Reload updated tokens
-            access_token = os.getenv("ACCESS_TOKEN")
-
-            # Update GUI and send a notification
-            self.update_access_token(access_token)
-            notification.notify(
-                title="Spotify Booster",
-                message="Token auto-refreshed successfully!",
-                app_name="Spotify Booster"
-            )
-        except Exception as e:
-            print(f"Error auto-refreshing tokens: {e}")
-            notification.notify(
-                title="Spotify Booster",
-                message=f"Error auto-refreshing tokens: {str(e)}",
-                app_name="Spotify Booster",
-            )
-
     def load_preferences(self):
         """Load user preferences from a JSON file."""
         try:
@@ -282,6 +365,7 @@ class AppController:
 
             with open(self.preferences_file, "w") as f:
                 json.dump(preferences, f, indent=4)
+            self.refresh_progress()
 
             notification.notify(
                 title="Spotify Booster",
@@ -296,23 +380,101 @@ class AppController:
                 app_name="Spotify Booster",
             )
 
-    def start_training(self):
-        """Start the training process for the model."""
+    def on_database_upgraded(self, error):
+        if error:
+            print(f"Error upgrading activity database: {error}")
+        self.refresh_progress()
+
+    def refresh_progress(self):
+        """Show plays and listening minutes this year for each song on the boost list."""
+        if not os.path.exists(self.activity_db_path) or self.upgrade_thread.isRunning():
+            return
         try:
-            QMessageBox.information(self.window, "Training", "Training has started!")
-            X_train, X_test, y_train, y_test, label_encoder = load_and_prepare_data()
-            self.model = train_and_evaluate_model(X_train, X_test, y_train, y_test)
-            self.label_encoder = label_encoder
-            QMessageBox.information(self.window, "Training", "Training completed!")
+            songs = [self.window.song_list.item(i).text() for i in range(self.window.song_list.count())]
+            conn = open_stats(self.activity_db_path)
+            try:
+                progress = boost_progress(conn, songs)
+            finally:
+                conn.close()
+            self.window.progress_list.clear()
+            self.window.progress_list.addItems([
+                f"{entry['song']}: {entry['plays']} plays, {entry['minutes']:.0f} min" for entry in progress
+            ])
+        except StatsUnavailableError:
+            # The file was replaced by an older one since startup; upgrade it in the background
+            self.upgrade_thread.start()
         except Exception as e:
-            QMessageBox.critical(self.window, "Error", f"Error during training: {e}")
+            print(f"Error loading listening progress: {e}")
+
+    def start_training(self):
+        """Start training in a background process, or queue a run if one is already going."""
+        if self.training_thread and self.training_thread.isRunning():
+            self.training_pending = True
+            self.window.training_status_label.setText("Training Status: Running (another run queued)")
+            return
+
+        self.training_pending = False
+        self.training_thread = TrainingThread()
+        self.training_thread.progress_signal.connect(self.update_training_progress)
+        self.training_thread.metrics_signal.connect(self.show_training_metrics)
+        self.training_thread.trained_signal.connect(self.training_completed)
+        self.training_thread.failed_signal.connect(self.training_failed)
+        self.training_thread.cancelled_signal.connect(self.training_cancelled)
+        self.training_thread.finished.connect(self.training_job_done)
+
+        self.window.training_status_label.setText("Training Status: Starting")
+        self.window.training_progress_bar.setValue(0)
+        self.window.cancel_training_button.setEnabled(True)
+        self.training_thread.start()
+
+    def cancel_training(self):
+        """Cancel the running training job and any queued run."""
+        self.training_pending = False
+        if self.training_thread and self.training_thread.isRunning():
+            self.training_thread.cancel()
+            self.window.training_status_label.setText("Training Status: Cancelling...")
+
+    def update_training_progress(self, stage, fraction):
+        self.window.training_status_label.setText(f"Training Status: {stage}")
+        self.window.training_progress_bar.setValue(int(fraction * 100))
+
+    def show_training_metrics(self, metrics):
+        self.training_metrics = metrics
+        self.window.training_metrics_label.setText(
+            f"Accuracy {metrics['accuracy']:.2f}, macro F1 {metrics['f1']:.2f} "
+            f"({metrics['training_rows']} training rows, {metrics['test_rows']} test rows)"
+        )
+
+    def training_completed(self, result):
+        self.model, self.label_encoder = result
+        self.window.training_status_label.setText("Training Status: Completed")
+        self.window.training_progress_bar.setValue(100)
+        notification.notify(
+            title="Spotify Booster",
+            message="Training completed!",
+            app_name="Spotify Booster",
+        )
+
+    def training_failed(self, message):
+        self.window.training_status_label.setText("Training Status: Failed")
+        QMessageBox.critical(self.window, "Error", f"Error during training: {message}")
+
+    def training_cancelled(self):
+        self.window.training_status_label.setText("Training Status: Cancelled")
+        self.window.training_progress_bar.setValue(0)
+
+    def training_job_done(self):
+        """Start the queued run, if any, once the previous job has fully finished."""
+        self.window.cancel_training_button.setEnabled(False)
+        if self.training_pending:
+            self.start_training()
 
     def create_model(self):
         """Create and save the trained model."""
         try:
             if self.model and self.label_encoder:
-                save_model(self.model, self.label_encoder)
-                QMessageBox.information(self.window, "Model Saved", "The model has been saved successfully!")
+                version = self.model_registry.save(self.model, self.label_encoder, self.training_metrics)
+                QMessageBox.information(self.window, "Model Saved", f"The model has been saved as version {version}!")
             else:
                 QMessageBox.warning(self.window, "Warning", "No trained model found. Train the model first.")
         except Exception as e:
@@ -321,27 +483,21 @@ class AppController:
     def start_prediction(self):
         """Load the model and display playback prediction chart."""
         try:
-            # Load model
-            self.model, self.label_encoder = joblib.load("machinelearning/saved_models/activity_model.pkl")
-            QMessageBox.information(self.window, "Prediction", "Model loaded successfully!")
-
-            # Generate predictions
-            now = pd.Timestamp.now()
-            future = pd.date_range(start=now, periods=24, freq='H')  # Next 24 hours
-            sample_data = pd.DataFrame({
-                "hour": future.hour,
-                "day_of_week": future.dayofweek,
-                "is_weekend": (future.dayofweek >= 5).astype(int)
-            })
-
-            predictions = self.model.predict(sample_data)
-            decoded_predictions = self.label_encoder.inverse_transform(predictions)
+            # Active model, only read from disk when a new version has been saved
+            model = self.model_registry.active()
+
+            # Generate predictions for the next 24 hours; a lookup in the model's week table
+            # (features are UTC, so look up by Unix time and plot in local time)
+            now = int(time.time())
+            timestamps = [now + hour * 3600 for hour in range(24)]
+            future = [datetime.fromtimestamp(ts) for ts in timestamps]
+            decoded_predictions = model.predict_at(timestamps)
 
             # Plot chart
             ax = self.window.chart_canvas.figure.add_subplot(111)
             ax.clear()
             ax.plot(future, decoded_predictions, label="Predicted Status")
-            ax.set_title("Playback Predictions")
+            ax.set_title(f"Playback Predictions (model version {model.version})")
             ax.set_xlabel("Time")
             ax.set_ylabel("Status")
             ax.legend()
@@ -354,10 +510,8 @@ class AppController:
     def play_song(self):
         """Start playback on Spotify."""
         try:
-            # Example URI for testing; replace with user-selected song if needed
-            example_song_uri = "spotify:track:2plbrEY59IikOBgBGLjaoe"
-            # https://open.spotify.com/track/2plbrEY59IikOBgBGLjaoe?si=73e7f6a50f7c43da spotify:track:2plbrEY59IikOBgBGLjaoe  spotify.com/track/ 2plbrEY59IikOBgBGLjaoe  ?si=73e7f6a50f7c43da
-            #  start_playback(example_song_uri)
+            # Play the whole boost list from preferences in one request
+            start_queue(use_preferences=True, repeat="context")
             self.window.token_label.setText("Playing song...")
             notification.notify(
                 title="Spotify Booster",
@@ -407,14 +561,14 @@ class AppController:
                 "start_time": start_time.isoformat(),
                 "end_time": end_time.isoformat(),
             }
-
-            with open(self.schedule_file, "w") as f:
-                json.dump(schedule, f, indent=4)
-
-            self.start_time = start_time
-            self.end_time = end_time
+            self.write_schedule(schedule)
             self.window.scheduler_label.setText("Schedule saved successfully!")
 
+            try:
+                notify_schedule_change(schedule)  # Let other connected clients pick it up
+            except Exception as e:
+                print(f"Error broadcasting schedule: {e}")
+
             notification.notify(
                 title="Spotify Booster",
                 message="Playback schedule saved!",
@@ -424,6 +578,25 @@ class AppController:
             print(f"Error saving schedule: {e}")
             self.window.scheduler_label.setText("Error saving schedule.")
 
+    def write_schedule(self, schedule):
+        """Save a schedule to the JSON file and make it the active one."""
+        start_time = datetime.fromisoformat(schedule["start_time"])
+        end_time = datetime.fromisoformat(schedule["end_time"])
+        with open(self.schedule_file, "w") as f:
+            json.dump({"start_time": schedule["start_time"], "end_time": schedule["end_time"]}, f, indent=4)
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def apply_remote_schedule(self, schedule):
+        """Apply and save a schedule saved by another client."""
+        try:
+            self.write_schedule(schedule)
+            self.window.scheduler_label.setText("Schedule updated from another client.")
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Ignoring invalid schedule update: {e}")
+        except OSError as e:
+            print(f"Error saving schedule update: {e}")
+
     def run_scheduler(self):
         """Continuously check if it's time to start or stop playback."""
         while True:
@@ -453,7 +626,7 @@ class AppController:
                 return
 
             try:
-                start_playback()  # Attempt to start playback
+                start_queue(use_preferences=True, repeat="context")  # Attempt to start playback
                 self.is_playing = True  # Set playback state
                 self.schedule_recheck()  # Schedule a recheck for later
 
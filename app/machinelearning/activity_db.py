@@ -0,0 +1,707 @@
+import argparse
+import queue
+from collections import defaultdict
+import sqlite3
+import time
+from threading import Thread, Event
+
+# Status codes stored in playback_activity.status
+STATUS_CODES = {"no_playback": 0, "paused": 1, "playing": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# Bump this and append to MIGRATIONS to change the schema; PRAGMA user_version
+# records which migrations a database file has already been through.
+SCHEMA_VERSION = 4
+
+# Account that rows from the single-account ActivityMonitor belong to
+DEFAULT_ACCOUNT_ID = 1
+
+
+def connect(db_path, readonly=False):
+    """
+    Open the activity database in WAL mode.
+
+    WAL lets the trainer and other readers query the log while the monitor
+    keeps writing, and synchronous=NORMAL makes each commit an append to
+    the WAL instead of a full fsync of the database file.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        readonly (bool): Open a read-only connection (for readers such as the trainer).
+    """
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    else:
+        conn = sqlite3.connect(db_path, timeout=30)
+        # Only takes effect on a new file, and must come before WAL mode creates it
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+V1_SCHEMA = [
+    """
+    CREATE TABLE statuses (
+        code INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE artists (
+        id INTEGER PRIMARY KEY,
+        spotify_id TEXT UNIQUE,
+        name TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE tracks (
+        id INTEGER PRIMARY KEY,
+        spotify_id TEXT UNIQUE,
+        uri TEXT,
+        name TEXT NOT NULL,
+        artist_names TEXT NOT NULL DEFAULT '',
+        duration_ms INTEGER
+    )
+    """,
+    """
+    CREATE TABLE track_artists (
+        track_id INTEGER NOT NULL REFERENCES tracks(id),
+        position INTEGER NOT NULL,
+        artist_id INTEGER NOT NULL REFERENCES artists(id),
+        PRIMARY KEY (track_id, position)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE devices (
+        id INTEGER PRIMARY KEY,
+        spotify_id TEXT UNIQUE,
+        name TEXT,
+        type TEXT
+    )
+    """,
+    """
+    CREATE TABLE playback_activity (
+        id INTEGER PRIMARY KEY,
+        timestamp INTEGER NOT NULL,
+        status INTEGER NOT NULL REFERENCES statuses(code),
+        track_id INTEGER REFERENCES tracks(id),
+        progress_ms INTEGER,
+        device_id INTEGER REFERENCES devices(id)
+    )
+    """,
+    "CREATE INDEX idx_playback_activity_timestamp ON playback_activity(timestamp)",
+    "CREATE INDEX idx_playback_activity_track ON playback_activity(track_id)",
+    "CREATE INDEX idx_track_artists_artist ON track_artists(artist_id)",
+    # Rows from the old text log (and any other sample without a Spotify ID)
+    # are deduplicated by name instead
+    "CREATE UNIQUE INDEX idx_tracks_unidentified ON tracks(name, artist_names) WHERE spotify_id IS NULL",
+    "CREATE UNIQUE INDEX idx_artists_unidentified ON artists(name) WHERE spotify_id IS NULL",
+    "CREATE UNIQUE INDEX idx_devices_unidentified ON devices(name) WHERE spotify_id IS NULL",
+    # The old column layout, for ad-hoc queries
+    """
+    CREATE VIEW activity_log AS
+        SELECT a.id, datetime(a.timestamp, 'unixepoch') AS timestamp, s.name AS status,
+               t.name AS song_name, NULLIF(t.artist_names, '') AS artist_name,
+               t.uri, t.duration_ms, a.progress_ms, d.name AS device_name
+        FROM playback_activity a
+        JOIN statuses s ON s.code = a.status
+        LEFT JOIN tracks t ON t.id = a.track_id
+        LEFT JOIN devices d ON d.id = a.device_id
+    """,
+]
+
+
+def _create_v1(conn):
+    """Normalized schema: one narrow row per sample, names live in dimension tables."""
+    for statement in V1_SCHEMA:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO statuses (code, name) VALUES (?, ?)", STATUS_NAMES.items())
+
+
+def _migrate_v1(conn):
+    """Move the free-text log (if any) into the normalized schema."""
+    legacy = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'playback_activity'"
+    ).fetchone()
+    if legacy:
+        conn.execute("ALTER TABLE playback_activity RENAME TO playback_activity_legacy")
+    _create_v1(conn)
+    if not legacy:
+        return
+
+    # Dimensions first, then a single INSERT ... SELECT for the samples
+    resolver = DimensionResolver()
+    for song_name, artist_name in conn.execute("""
+        SELECT DISTINCT song_name, artist_name FROM playback_activity_legacy WHERE song_name IS NOT NULL
+    """).fetchall():
+        resolver.track_id(conn, named_track(song_name, artist_name))
+
+    conn.execute("""
+        INSERT INTO playback_activity (id, timestamp, status, track_id)
+        SELECT l.id,
+               COALESCE(CAST(strftime('%s', l.timestamp) AS INTEGER), 0),
+               CASE l.status WHEN 'playing' THEN 2 WHEN 'paused' THEN 1 ELSE 0 END,
+               t.id
+        FROM playback_activity_legacy l
+        LEFT JOIN tracks t
+            ON t.spotify_id IS NULL AND t.name = l.song_name AND t.artist_names = COALESCE(l.artist_name, '')
+    """)
+    conn.execute("DROP TABLE playback_activity_legacy")
+
+
+def _migrate_v2(conn):
+    """Per-account rows, so one database can hold many monitored accounts."""
+    conn.execute("""
+        CREATE TABLE accounts (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+    """)
+    conn.execute("INSERT INTO accounts (id, name) VALUES (?, 'default')", (DEFAULT_ACCOUNT_ID,))
+    # Existing rows all came from the single-account monitor
+    conn.execute(f"ALTER TABLE playback_activity ADD COLUMN account_id INTEGER NOT NULL DEFAULT {DEFAULT_ACCOUNT_ID}")
+    conn.execute("CREATE INDEX idx_playback_activity_account ON playback_activity(account_id, timestamp)")
+    conn.execute("DROP VIEW activity_log")
+    conn.execute("""
+        CREATE VIEW activity_log AS
+            SELECT a.id, datetime(a.timestamp, 'unixepoch') AS timestamp, s.name AS status,
+                   t.name AS song_name, NULLIF(t.artist_names, '') AS artist_name,
+                   t.uri, t.duration_ms, a.progress_ms, d.name AS device_name, acc.name AS account
+            FROM playback_activity a
+            JOIN statuses s ON s.code = a.status
+            JOIN accounts acc ON acc.id = a.account_id
+            LEFT JOIN tracks t ON t.id = a.track_id
+            LEFT JOIN devices d ON d.id = a.device_id
+    """)
+
+
+def _migrate_v3(conn):
+    """Listening-time rollups, kept up to date by the writer and backfilled from existing rows."""
+    conn.execute("""
+        CREATE TABLE track_rollup (
+            account_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            track_id INTEGER NOT NULL REFERENCES tracks(id),
+            plays INTEGER NOT NULL DEFAULT 0,
+            listened_ms INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, year, track_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE artist_rollup (
+            account_id INTEGER NOT NULL,
+            year INTEGER NOT NULL,
+            artist_id INTEGER NOT NULL REFERENCES artists(id),
+            plays INTEGER NOT NULL DEFAULT 0,
+            listened_ms INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, year, artist_id)
+        ) WITHOUT ROWID
+    """)
+    # One row per account per clock hour (Unix time of the hour's start, UTC)
+    conn.execute("""
+        CREATE TABLE hourly_rollup (
+            account_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            samples INTEGER NOT NULL DEFAULT 0,
+            playing_samples INTEGER NOT NULL DEFAULT 0,
+            plays INTEGER NOT NULL DEFAULT 0,
+            listened_ms INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, hour)
+        ) WITHOUT ROWID
+    """)
+    # Last sample folded in per account, so attribution continues across restarts
+    conn.execute("""
+        CREATE TABLE rollup_state (
+            account_id INTEGER PRIMARY KEY,
+            timestamp INTEGER NOT NULL,
+            status INTEGER NOT NULL,
+            track_id INTEGER,
+            progress_ms INTEGER,
+            duration_ms INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX idx_tracks_name ON tracks(name COLLATE NOCASE)")
+
+    rollups = RollupUpdater()
+    cursor = conn.execute("""
+        SELECT a.timestamp, a.status, a.track_id, a.progress_ms, t.duration_ms, a.account_id
+        FROM playback_activity a
+        LEFT JOIN tracks t ON t.id = a.track_id
+        ORDER BY a.account_id, a.timestamp, a.id
+    """)
+    while True:
+        samples = cursor.fetchmany(10000)
+        if not samples:
+            break
+        rollups.apply(conn, samples)
+
+
+def _migrate_v4(conn):
+    """Hourly buckets that old raw samples are downsampled into (see retention.py)."""
+    # track_id 0 stands for samples without a track, so it can be part of the key
+    conn.execute("""
+        CREATE TABLE activity_hourly (
+            account_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            status INTEGER NOT NULL REFERENCES statuses(code),
+            track_id INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (account_id, hour, status, track_id)
+        ) WITHOUT ROWID
+    """)
+
+
+MIGRATIONS = [
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Bring the database up to SCHEMA_VERSION in place.
+
+    Each pending migration runs in one transaction together with the
+    user_version bump, so an interrupted upgrade leaves the file at the
+    last version that completed. Returns the number of migrations applied.
+    """
+    _enable_incremental_vacuum(conn)
+    applied = 0
+    for version, upgrade in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            upgrade(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied += 1
+        print(f"Upgraded activity database to schema version {version}.")
+    return applied
+
+
+def _enable_incremental_vacuum(conn):
+    """Let retention hand freed pages back to the filesystem a few at a time."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    if conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        # Existing files only switch modes on a rebuild; new ones pick it up from the first table
+        print("Rebuilding activity database for incremental vacuum...")
+        conn.execute("VACUUM")
+
+
+def initialize_schema(conn):
+    """Create the activity tables, or upgrade an older database in place."""
+    migrate(conn)
+
+
+def upgrade(db_path):
+    """Upgrade the database file in place; a no-op once it is current. Returns its schema version."""
+    conn = connect(db_path)
+    try:
+        if schema_version(conn) < SCHEMA_VERSION:
+            migrate(conn)
+        return schema_version(conn)
+    finally:
+        conn.close()
+
+
+def register_accounts(db_path, names):
+    """Return {name: account_id} for the given account names, creating missing accounts."""
+    conn = connect(db_path)
+    try:
+        initialize_schema(conn)
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO accounts (name) VALUES (?)", [(name,) for name in names])
+        return dict(conn.execute("SELECT name, id FROM accounts").fetchall())
+    finally:
+        conn.close()
+
+
+def named_track(song_name, artist_name=None):
+    """Track dict (shaped like a Spotify track object) for a sample known only by name."""
+    artists = artist_name.split(", ") if artist_name else []
+    return {"name": song_name, "artists": [{"name": name} for name in artists]}
+
+
+class DimensionResolver:
+    """Map Spotify track, artist and device objects to dimension table ids, caching the lookups."""
+
+    def __init__(self):
+        self._ids = {}
+
+    def _lookup(self, conn, table, spotify_id, columns, match):
+        """Return (id, created) for a dimension row, inserting it if needed.
+
+        Rows with a Spotify ID are matched on it; rows without one on the `match` columns.
+        """
+        key = (table, spotify_id or tuple(columns[name] for name in match))
+        if key in self._ids:
+            return self._ids[key], False
+        if spotify_id:
+            row = conn.execute(f"SELECT id FROM {table} WHERE spotify_id = ?", (spotify_id,)).fetchone()
+        else:
+            where = " AND ".join(f"{name} = ?" for name in match)
+            row = conn.execute(
+                f"SELECT id FROM {table} WHERE spotify_id IS NULL AND {where}", [columns[name] for name in match]
+            ).fetchone()
+        created = row is None
+        if created:
+            names = ["spotify_id", *columns]
+            row = conn.execute(
+                f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) RETURNING id",
+                [spotify_id, *columns.values()],
+            ).fetchone()
+        self._ids[key] = row[0]
+        return row[0], created
+
+    def artist_id(self, conn, artist):
+        return self._lookup(conn, "artists", artist.get("id"), {"name": artist["name"]}, ["name"])[0]
+
+    def track_id(self, conn, track):
+        artists = track.get("artists") or []
+        columns = {
+            "uri": track.get("uri"),
+            "name": track["name"],
+            "artist_names": ", ".join(artist["name"] for artist in artists),
+            "duration_ms": track.get("duration_ms"),
+        }
+        track_id, created = self._lookup(conn, "tracks", track.get("id"), columns, ["name", "artist_names"])
+        if created:
+            conn.executemany(
+                "INSERT INTO track_artists (track_id, position, artist_id) VALUES (?, ?, ?)",
+                [(track_id, position, self.artist_id(conn, artist)) for position, artist in enumerate(artists)],
+            )
+        return track_id
+
+    def device_id(self, conn, device):
+        columns = {"name": device.get("name"), "type": device.get("type")}
+        return self._lookup(conn, "devices", device.get("id"), columns, ["name"])[0]
+
+
+class RollupUpdater:
+    """
+    Fold new samples into the track, artist and hourly rollups.
+
+    Listening time is estimated from consecutive samples of an account:
+    while the same track keeps playing it is credited with the progress
+    made between them; when the track changes, the previous one is
+    credited with what was left of it and the new one with its current
+    progress, never more than the time between the samples. A new track
+    (or a restart of the same one) counts as a play. Samples without
+    progress (rows from before it was recorded) count plays only.
+    """
+
+    def __init__(self):
+        self._last = {}  # account_id -> last sample folded in
+        self._track_artists = {}
+
+    def apply(self, conn, samples):
+        """
+        Update the rollups for `samples` inside the caller's transaction.
+
+        Args:
+            conn (sqlite3.Connection): Connection with the transaction open.
+            samples (list): (timestamp, status, track_id, progress_ms, duration_ms, account_id)
+                tuples, in time order per account.
+        """
+        tracks = defaultdict(lambda: [0, 0])
+        artists = defaultdict(lambda: [0, 0])
+        hours = defaultdict(lambda: [0, 0, 0, 0])
+        for sample in samples:
+            timestamp, status, _, _, _, account_id = sample
+            year = time.gmtime(timestamp).tm_year
+            hour = hours[(account_id, timestamp - timestamp % 3600)]
+            hour[0] += 1
+            hour[1] += status == STATUS_CODES["playing"]
+            for track_id, listened_ms, plays in self._attribute(self._previous(conn, account_id), sample):
+                for totals in [tracks[(account_id, year, track_id)]] + [
+                    artists[(account_id, year, artist_id)] for artist_id in self._artists(conn, track_id)
+                ]:
+                    totals[0] += plays
+                    totals[1] += listened_ms
+                hour[2] += plays
+                hour[3] += listened_ms
+            self._last[account_id] = sample
+
+        conn.executemany("""
+            INSERT INTO track_rollup (account_id, year, track_id, plays, listened_ms) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET plays = plays + excluded.plays, listened_ms = listened_ms + excluded.listened_ms
+        """, [(*key, *totals) for key, totals in tracks.items()])
+        conn.executemany("""
+            INSERT INTO artist_rollup (account_id, year, artist_id, plays, listened_ms) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET plays = plays + excluded.plays, listened_ms = listened_ms + excluded.listened_ms
+        """, [(*key, *totals) for key, totals in artists.items()])
+        conn.executemany("""
+            INSERT INTO hourly_rollup (account_id, hour, samples, playing_samples, plays, listened_ms)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO UPDATE SET
+                samples = samples + excluded.samples,
+                playing_samples = playing_samples + excluded.playing_samples,
+                plays = plays + excluded.plays,
+                listened_ms = listened_ms + excluded.listened_ms
+        """, [(*key, *totals) for key, totals in hours.items()])
+        conn.executemany("""
+            INSERT OR REPLACE INTO rollup_state (account_id, timestamp, status, track_id, progress_ms, duration_ms)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, {sample[5]: (sample[5], *sample[:5]) for sample in samples}.values())
+
+    def _previous(self, conn, account_id):
+        if account_id not in self._last:
+            row = conn.execute("""
+                SELECT timestamp, status, track_id, progress_ms, duration_ms, account_id
+                FROM rollup_state WHERE account_id = ?
+            """, (account_id,)).fetchone()
+            self._last[account_id] = row
+        return self._last[account_id]
+
+    def _artists(self, conn, track_id):
+        if track_id not in self._track_artists:
+            self._track_artists[track_id] = [
+                row[0] for row in conn.execute("SELECT artist_id FROM track_artists WHERE track_id = ?", (track_id,))
+            ]
+        return self._track_artists[track_id]
+
+    @staticmethod
+    def _attribute(previous, sample):
+        """Return [(track_id, listened_ms, plays)] credited by `sample` given the one before it."""
+        timestamp, status, track_id, progress_ms, _, _ = sample
+        playing = status == STATUS_CODES["playing"] and track_id is not None
+        gap_ms = max(timestamp - previous[0], 0) * 1000 if previous else None
+        if previous:
+            prev_timestamp, prev_status, prev_track, prev_progress, prev_duration, _ = previous
+            if (track_id is not None and track_id == prev_track and progress_ms is not None
+                    and prev_progress is not None and progress_ms >= prev_progress):
+                # Same track carried on (possibly paused in between)
+                if playing or prev_status == STATUS_CODES["playing"]:
+                    return [(track_id, min(progress_ms - prev_progress, gap_ms), 0)]
+                return []
+
+        credits = []
+        if previous and prev_status == STATUS_CODES["playing"] and prev_track is not None and prev_duration:
+            # The previous track played on to its end, or until playback stopped
+            rest = min(max(prev_duration - (prev_progress or 0), 0), gap_ms)
+            credits.append((prev_track, rest, 0))
+            gap_ms -= rest
+        if playing:
+            listened_ms = progress_ms or 0
+            credits.append((track_id, listened_ms if gap_ms is None else min(listened_ms, gap_ms), 1))
+        return credits
+
+
+class ActivityWriterError(Exception):
+    """Raised when the ActivityWriter isn't running or couldn't commit the rows a flush waited for."""
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = Event()
+        self.error = None  # Set when the rows before the request weren't committed
+
+
+class ActivityWriter:
+    def __init__(self, db_path, batch_size=500, flush_interval=5, max_pending=100_000):
+        """
+        Background writer that batches activity rows into periodic transactions.
+
+        One long-lived connection is owned by the writer thread; callers only
+        enqueue rows, so sampling never waits on SQLite. A batch that fails with
+        a transient error (e.g. "database is locked") stays pending and is
+        retried with the next commit.
+
+        Args:
+            db_path (str): Path to the SQLite database file.
+            batch_size (int): Commit as soon as this many rows are pending.
+            flush_interval (float): Commit pending rows at least this often, in seconds.
+            max_pending (int): Most uncommitted rows kept while commits keep failing;
+                the oldest are dropped beyond that.
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._thread = None
+        self._ready = Event()
+        self._error = None
+        self._dimensions = DimensionResolver()
+        self._rollups = RollupUpdater()
+
+    def start(self):
+        """Open the connection and start the writer thread."""
+        if self._thread is None:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+            self._ready.wait()
+            if self._error:
+                raise self._error
+
+    def write(self, status, track=None, progress_ms=None, device=None, timestamp=None, account_id=DEFAULT_ACCOUNT_ID):
+        """
+        Queue one activity row; it is committed with the next batch.
+
+        Args:
+            status (str): "playing", "paused" or "no_playback".
+            track (dict): Spotify track object (`id`, `uri`, `name`, `duration_ms`, `artists`),
+                or one built with `named_track` when only names are known.
+            progress_ms (int): Playback position within the track.
+            device (dict): Spotify device object (`id`, `name`, `type`).
+            timestamp (int): Unix time of the sample; defaults to now.
+            account_id (int): Account the sample belongs to (see `register_accounts`).
+        """
+        self._queue.put((int(timestamp or time.time()), STATUS_CODES[status], track, progress_ms, device, account_id))
+
+    def _check_running(self):
+        if self._error is not None:
+            raise ActivityWriterError(f"Activity writer stopped: {self._error}") from self._error
+        if self._thread is None or not self._thread.is_alive():
+            raise ActivityWriterError("Activity writer is not running.")
+
+    def flush(self, timeout=60):
+        """
+        Block until every row queued so far is committed.
+
+        Raises:
+            ActivityWriterError: The writer isn't running, stopped while waiting,
+                or the commit failed (rows failing with a transient error stay queued).
+            TimeoutError: The rows weren't committed within `timeout` seconds.
+        """
+        self._check_running()
+        request = _FlushRequest()
+        self._queue.put(request)
+        deadline = time.monotonic() + timeout
+        # Wait in slices so a writer thread that dies meanwhile doesn't leave us blocked
+        while not request.done.wait(min(max(deadline - time.monotonic(), 0), 0.5)):
+            self._check_running()
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Activity rows not committed within {timeout} seconds.")
+        if request.error is not None:
+            raise ActivityWriterError(f"Activity rows not committed: {request.error}") from request.error
+
+    def close(self):
+        """Commit pending rows and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            conn = connect(self.db_path)
+            initialize_schema(conn)
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        try:
+            self._loop(conn)
+        except BaseException as e:
+            self._error = e  # Raised by the next flush() instead of leaving it waiting
+            raise
+        finally:
+            conn.close()
+
+    def _loop(self, conn):
+        rows, waiters = [], []
+        deadline = time.monotonic() + self.flush_interval
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = _FlushRequest()  # Interval elapsed: commit whatever is pending
+
+            if item is None:
+                running = False
+            elif isinstance(item, _FlushRequest):
+                waiters.append(item)
+            else:
+                rows.append(item)
+                if len(rows) < self.batch_size:
+                    continue
+
+            error = self._commit(conn, rows)
+            if not isinstance(error, sqlite3.OperationalError):
+                rows = []  # Committed, or failed in a way a retry won't fix
+            elif len(rows) > self.max_pending:
+                print(f"Dropping {len(rows) - self.max_pending} activity rows after repeated commit failures.")
+                rows = rows[-self.max_pending:]
+            for waiter in waiters:
+                waiter.error = error
+                waiter.done.set()
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+
+    def _commit(self, conn, rows):
+        """Commit `rows`; returns None, or the error that kept them from being committed."""
+        if not rows:
+            return None
+        try:
+            with conn:
+                resolved = [
+                    (
+                        timestamp,
+                        status,
+                        self._dimensions.track_id(conn, track) if track else None,
+                        progress_ms,
+                        self._dimensions.device_id(conn, device) if device else None,
+                        account_id,
+                    )
+                    for timestamp, status, track, progress_ms, device, account_id in rows
+                ]
+                conn.executemany("""
+                    INSERT INTO playback_activity (timestamp, status, track_id, progress_ms, device_id, account_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, resolved)
+                # Rollups commit in the same transaction, so they always match the log
+                self._rollups.apply(conn, [
+                    (timestamp, status, track_id, progress_ms, track.get("duration_ms") if track else None, account_id)
+                    for (timestamp, status, track_id, progress_ms, _, account_id), (_, _, track, _, _, _)
+                    in zip(resolved, rows)
+                ])
+        except sqlite3.Error as e:
+            # Ids and rollup state cached during the failed transaction may have been rolled back
+            self._dimensions = DimensionResolver()
+            self._rollups = RollupUpdater()
+            if isinstance(e, sqlite3.OperationalError):
+                # Locked, busy or out of disk: the rows stay pending for the next commit
+                print(f"Error writing {len(rows)} activity rows, retrying with the next batch: {e}")
+            else:
+                print(f"Error writing {len(rows)} activity rows: {e}")
+            return e
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade an activity database to the current schema.")
+    parser.add_argument("db_path", nargs="?", default="activity_log.db")
+    parser.add_argument("--vacuum", action="store_true", help="Rebuild the file afterwards to reclaim the old table's space.")
+    args = parser.parse_args()
+
+    conn = connect(args.db_path)
+    before = schema_version(conn)
+    conn.close()
+    after = upgrade(args.db_path)
+    if args.vacuum:
+        conn = connect(args.db_path)
+        conn.execute("VACUUM")
+        conn.close()
+    print(f"{args.db_path}: schema version {before} -> {after}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import time
+import pyarrow as pa # type: ignore
+import pyarrow.compute as pc # type: ignore
+import pyarrow.dataset as ds # type: ignore
+import pyarrow.parquet as pq # type: ignore
+
+try:
+    from .activity_db import connect, upgrade, STATUS_NAMES
+except ImportError:  # Run as a script from machinelearning/
+    from activity_db import connect, upgrade, STATUS_NAMES
+
+# Incremental Parquet copy of playback_activity for training. Each run appends
+# only rows with an id above the watermark, as one file per month partition:
+#   activity_dataset/month=2024-11/part-000000001001-000000002000.parquet
+#   activity_dataset/_watermark.json
+# Training then reads just the columns it needs, memory-mapped, instead of
+# pulling the table through SQLite. Readers only see rows up to the watermark,
+# and parts past it (left by a crash before the watermark moved) are deleted
+# before the next append. Retention exports before it downsamples, so every raw
+# sample reaches the dataset; the hourly buckets themselves are never exported.
+# Run from machinelearning/: python activity_export.py
+DATABASE_PATH = "activity_log.db"
+DATASET_PATH = "activity_dataset"
+
+STRING_DICT = pa.dictionary(pa.int32(), pa.string())
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("timestamp", pa.timestamp("s", tz="UTC")),
+    ("status", pa.dictionary(pa.int8(), pa.string())),
+    ("account_id", pa.int32()),
+    ("track_id", pa.int32()),
+    ("song_name", STRING_DICT),
+    ("artist_name", STRING_DICT),
+    ("progress_ms", pa.int32()),
+    ("duration_ms", pa.int32()),
+    ("device_id", pa.int32()),
+])
+STATUS_DICTIONARY = pa.array([STATUS_NAMES[code] for code in sorted(STATUS_NAMES)])
+
+
+def read_watermark(dataset_path=DATASET_PATH):
+    """Export progress: {"last_id", "first_timestamp", "rows"}; zeros for a new dataset."""
+    try:
+        with open(os.path.join(dataset_path, "_watermark.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_id": 0, "first_timestamp": None, "rows": 0}
+
+
+def _write_watermark(dataset_path, watermark):
+    path = os.path.join(dataset_path, "_watermark.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(watermark, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _to_table(rows):
+    """Build a typed Arrow table from (id, timestamp, status, ...) rows."""
+    columns = list(zip(*rows))
+    status_codes = pa.array(columns[2], pa.int8())
+    return pa.Table.from_arrays([
+        pa.array(columns[0], pa.int64()),
+        pa.array(columns[1], pa.int64()).cast(pa.timestamp("s", tz="UTC")),
+        pa.DictionaryArray.from_arrays(status_codes, STATUS_DICTIONARY),
+        pa.array(columns[3], pa.int32()),
+        pa.array(columns[4], pa.int32()),
+        pa.array(columns[5], pa.string()).dictionary_encode(),
+        pa.array(columns[6], pa.string()).dictionary_encode(),
+        pa.array(columns[7], pa.int32()),
+        pa.array(columns[8], pa.int32()),
+        pa.array(columns[9], pa.int32()),
+    ], schema=SCHEMA)
+
+
+def _write_partitions(dataset_path, table):
+    """Split a chunk by month and write one Parquet file per month."""
+    months = pc.strftime(table["timestamp"], format="%Y-%m")
+    for month in pc.unique(months).to_pylist():
+        part = table.filter(pc.equal(months, month))
+        first, last = part["id"][0].as_py(), part["id"][-1].as_py()
+        directory = os.path.join(dataset_path, f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{first:012d}-{last:012d}.parquet"
+        # Readers skip dot-files, so they never see a half-written part
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        pq.write_table(part, tmp_path, compression="zstd", use_dictionary=True)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+
+def _remove_unrecorded_parts(dataset_path, last_id):
+    """Delete parts starting past the watermark, written by an append that crashed before recording them."""
+    for directory in os.listdir(dataset_path):
+        if not directory.startswith("month="):
+            continue
+        for name in os.listdir(os.path.join(dataset_path, directory)):
+            stale_tmp = name.startswith(".") and name.endswith(".tmp")
+            if stale_tmp or (name.startswith("part-") and int(name[5:17]) > last_id):
+                os.remove(os.path.join(dataset_path, directory, name))
+
+
+def append_table(table, dataset_path=DATASET_PATH):
+    """
+    Add a SCHEMA table, ordered by id and above the watermark, to the dataset.
+
+    The watermark is only advanced after the table's files are in place; parts
+    a crashed append left past the watermark are removed first, so their rows
+    are never read twice.
+    """
+    os.makedirs(dataset_path, exist_ok=True)
+    watermark = read_watermark(dataset_path)
+    _remove_unrecorded_parts(dataset_path, watermark["last_id"])
+    _write_partitions(dataset_path, table)
+
+    watermark["last_id"] = table["id"][-1].as_py()
+    first_timestamp = pc.min(table["timestamp"].cast(pa.int64())).as_py()
+    if watermark["first_timestamp"] is None or first_timestamp < watermark["first_timestamp"]:
+        watermark["first_timestamp"] = first_timestamp
+    watermark["rows"] += table.num_rows
+    _write_watermark(dataset_path, watermark)
+
+
+def export_activity(db_path=DATABASE_PATH, dataset_path=DATASET_PATH, chunk_size=1_000_000):
+    """
+    Append rows added since the last export to the Parquet dataset.
+
+    The watermark is only advanced after a chunk's files are in place, so
+    an interrupted export resumes where it stopped.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        dataset_path (str): Directory of the Parquet dataset.
+        chunk_size (int): Rows read from SQLite and written per step.
+
+    Returns:
+        int: Number of rows exported.
+    """
+    upgrade(db_path)
+    last_id = read_watermark(dataset_path)["last_id"]
+    conn = connect(db_path, readonly=True)
+    exported = 0
+    try:
+        while True:
+            rows = conn.execute("""
+                SELECT a.id, a.timestamp, a.status, a.account_id, a.track_id,
+                       t.name, NULLIF(t.artist_names, ''), a.progress_ms, t.duration_ms, a.device_id
+                FROM playback_activity a
+                LEFT JOIN tracks t ON t.id = a.track_id
+                WHERE a.id > ?
+                ORDER BY a.id
+                LIMIT ?
+            """, (last_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            append_table(_to_table(rows), dataset_path)
+            last_id = rows[-1][0]
+            exported += len(rows)
+    finally:
+        conn.close()
+    return exported
+
+
+def read_activity(dataset_path=DATASET_PATH, columns=None):
+    """Read the exported rows (optionally only `columns`) as a pandas DataFrame, memory-mapped."""
+    watermark = read_watermark(dataset_path)
+    if not watermark["rows"]:
+        return SCHEMA.empty_table().select(columns or SCHEMA.names).to_pandas()
+    table = pq.read_table(dataset_path, columns=columns, memory_map=True, partitioning="hive", schema=SCHEMA,
+                          filters=[("id", "<=", watermark["last_id"])])
+    return table.to_pandas()
+
+
+def read_activity_after(last_id, dataset_path=DATASET_PATH, columns=None):
+    """Exported rows with an id above `last_id` as an Arrow table; files entirely below it are skipped."""
+    watermark = read_watermark(dataset_path)
+    if not watermark["rows"]:
+        return SCHEMA.empty_table().select(columns or SCHEMA.names)
+    dataset = ds.dataset(dataset_path, format="parquet", partitioning="hive", schema=SCHEMA)
+    return dataset.to_table(columns=columns,
+                            filter=(ds.field("id") > last_id) & (ds.field("id") <= watermark["last_id"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export new activity rows to the Parquet dataset.")
+    parser.add_argument("--db-path", default=DATABASE_PATH)
+    parser.add_argument("--dataset-path", default=DATASET_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    exported = export_activity(args.db_path, args.dataset_path)
+    print(f"Exported {exported} rows in {time.perf_counter() - start:.1f}s "
+          f"(watermark: {read_watermark(args.dataset_path)}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,99 +1,91 @@
+import sys
 import time
-import requests # type: ignore
-import sqlite3
 from threading import Thread
 from datetime import datetime
-from dotenv import load_dotenv
 from pathlib import Path
-import os
+from activity_db import ActivityWriter
+from poll_schedule import AdaptivePollSchedule
 
-dotenv_path = Path(__file__).parent.parent / ".user"  # Adjust for relative paths
-load_dotenv(dotenv_path)
+try:
+    from api_client import spotify, RateLimitedError
+except ImportError:  # Run as a script from machinelearning/
+    sys.path.append(str(Path(__file__).parent.parent))
+    from api_client import spotify, RateLimitedError
+
+def parse_playback(data):
+    """Pick the fields the log keeps out of a /me/player response; None for ads and other non-tracks."""
+    item = data.get("item")
+    if not item:
+        return None
+    return {
+        "is_playing": data.get("is_playing", False),
+        "song_name": item["name"],
+        "artist_name": ", ".join(artist["name"] for artist in item["artists"]),
+        "progress_ms": data.get("progress_ms"),
+        "duration_ms": item.get("duration_ms"),
+        "item": item,
+        "device": data.get("device"),
+    }
 
 class ActivityMonitor:
-    def __init__(self, db_path="activity_log.db", check_interval=600):
+    def __init__(self, db_path="activity_log.db", check_interval=600, flush_interval=5, adaptive=True, idle_interval=30):
         """
         Monitor Spotify playback activity and log it periodically.
         
         Args:
             db_path (str): Path to the SQLite database file.
             check_interval (int): Interval in seconds to check playback status (default 10 minutes).
+                With `adaptive`, this is the longest gap between polls instead.
+            flush_interval (float): Seconds between batched commits to the database.
+            adaptive (bool): Poll right after the current track ends, backing off while idle.
+            idle_interval (float): First adaptive delay after playback stops, in seconds.
         """
         self.db_path = db_path
         self.check_interval = check_interval
         self.running = False
+        self.schedule = AdaptivePollSchedule(max_interval=check_interval, idle_interval=idle_interval) if adaptive else None
 
-        # Initialize database
-        self._initialize_db()
-
-    def _initialize_db(self):
-        """Create the database table if it doesn't exist."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS playback_activity (
-                id INTEGER PRIMARY KEY,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                status TEXT,
-                song_name TEXT,
-                artist_name TEXT
-            )
-        """)
-        conn.commit()
-        conn.close()
+        # Initialize database; one long-lived WAL connection owned by the writer thread
+        self.writer = ActivityWriter(db_path, flush_interval=flush_interval)
+        self.writer.start()
 
     def _get_playback_status(self):
         """Fetch the current playback status from Spotify."""
-        access_token = os.getenv("ACCESS_TOKEN")
-        if not access_token:
-            raise Exception("Access token not found. Please log in.")
-
-        headers = {"Authorization": f"Bearer {access_token}"}
-        url = "https://api.spotify.com/v1/me/player/currently-playing"
-
-        response = requests.get(url, headers=headers)
-        if response.status_code == 204:  # No content (no playback)
+        # Shared keep-alive session; a 401 refreshes the token through the backend and retries
+        data = spotify.get_json("/me/player")  # Like currently-playing, plus the device
+        if data is None:  # No content (no playback)
             return None
-        response.raise_for_status()
-
-        data = response.json()
-        is_playing = data.get("is_playing", False)
-        song_name = data["item"]["name"]
-        artist_name = ", ".join(artist["name"] for artist in data["item"]["artists"])
-
-        return {
-            "is_playing": is_playing,
-            "song_name": song_name,
-            "artist_name": artist_name,
-        }
+        return parse_playback(data)
 
-    def _log_activity(self, status, song_name=None, artist_name=None):
-        """Log playback activity in the database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO playback_activity (status, song_name, artist_name)
-            VALUES (?, ?, ?)
-        """, (status, song_name, artist_name))
-        conn.commit()
-        conn.close()
+    def _log_activity(self, status, playback=None):
+        """Log playback activity in the database (committed with the next batch)."""
+        if playback:
+            self.writer.write(status, playback["item"], playback["progress_ms"], playback["device"])
+        else:
+            self.writer.write(status)
 
     def _monitor(self):
         """Continuously monitor and log playback activity."""
         while self.running:
+            playback, retry_after = None, 0
             try:
                 playback = self._get_playback_status()
                 if playback:
                     status = "playing" if playback["is_playing"] else "paused"
-                    self._log_activity(status, playback["song_name"], playback["artist_name"])
+                    self._log_activity(status, playback)
                     print(f"Logged: {status} - {playback['song_name']} by {playback['artist_name']}")
                 else:
                     self._log_activity("no_playback")
                     print("Logged: No playback detected.")
+            except RateLimitedError as e:
+                # Back off instead of polling into the rate limit again
+                print(e)
+                retry_after = e.retry_after
             except Exception as e:
                 print(f"Error during monitoring: {e}")
 
-            time.sleep(self.check_interval)
+            delay = self.schedule.next_delay(playback) if self.schedule else self.check_interval
+            time.sleep(max(delay, retry_after))
 
     def start(self):
         """Start the playback activity monitor."""
@@ -104,7 +96,8 @@ class ActivityMonitor:
             print("Activity monitor started.")
 
     def stop(self):
-        """Stop the playback activity monitor."""
+        """Stop the playback activity monitor and flush pending rows."""
         self.running = False
         self.thread.join()
+        self.writer.close()
         print("Activity monitor stopped.")
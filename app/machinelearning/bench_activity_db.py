@@ -0,0 +1,77 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from activity_db import ActivityWriter, named_track
+
+# Rows/second of the old per-sample connect/insert/commit/close pattern versus
+# the batched WAL ActivityWriter. Uses throwaway databases in a temp directory.
+# Run from machinelearning/: python bench_activity_db.py --rows 2000
+
+
+def bench_connection_per_row(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE playback_activity (
+            id INTEGER PRIMARY KEY,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            status TEXT,
+            song_name TEXT,
+            artist_name TEXT
+        )
+    """)
+    conn.close()
+
+    start = time.perf_counter()
+    for i in range(rows):
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO playback_activity (status, song_name, artist_name)
+            VALUES (?, ?, ?)
+        """, ("playing", f"Song {i % 100}", f"Artist {i % 50}"))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_batched_writer(db_path, rows, flush_interval):
+    writer = ActivityWriter(db_path, flush_interval=flush_interval)
+    writer.start()
+    start = time.perf_counter()
+    for i in range(rows):
+        writer.write("playing", named_track(f"Song {i % 100}", f"Artist {i % 50}"))
+    writer.flush()  # Count the time until everything is durable in the WAL
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return elapsed
+
+
+def count_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM playback_activity").fetchone()[0]
+    conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark activity log inserts.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--flush-interval", type=float, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, "before.db")
+        after_path = os.path.join(tmp, "after.db")
+
+        before = bench_connection_per_row(before_path, args.rows)
+        after = bench_batched_writer(after_path, args.rows, args.flush_interval)
+        assert count_rows(before_path) == count_rows(after_path) == args.rows
+
+        print(f"connection per row:   {args.rows / before:>12,.0f} rows/s ({before:.2f}s)")
+        print(f"batched WAL writer:   {args.rows / after:>12,.0f} rows/s ({after:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
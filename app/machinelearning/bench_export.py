@@ -0,0 +1,82 @@
+import argparse
+import os
+import tempfile
+import time
+import pandas as pd # type: ignore
+from activity_db import connect, upgrade
+from activity_export import export_activity, read_activity
+
+# Training read time straight from SQLite versus the incremental Parquet export,
+# at several table sizes. Uses throwaway databases in a temp directory.
+# Run from machinelearning/: python bench_export.py --rows 1000000 10000000
+
+
+def fill(db_path, rows, start_id=1):
+    """Bulk-insert synthetic samples (one a minute, 500 tracks) with a recursive CTE."""
+    upgrade(db_path)
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO tracks (id, spotify_id, name, artist_names, duration_ms) VALUES (?, ?, ?, ?, ?)",
+            [(i, f"track{i}", f"Song {i}", f"Artist {i % 40}", 200000) for i in range(1, 501)],
+        )
+        conn.execute("""
+            WITH RECURSIVE n(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM n WHERE i < ?)
+            INSERT INTO playback_activity (id, timestamp, status, track_id, progress_ms, account_id)
+            SELECT i, 1700000000 + i * 60, i % 3,
+                   CASE WHEN i % 3 = 0 THEN NULL ELSE 1 + i % 500 END,
+                   CASE WHEN i % 3 = 0 THEN NULL ELSE (i * 7919) % 200000 END,
+                   1
+            FROM n
+        """, (start_id, start_id + rows - 1))
+    conn.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def bench(rows, tmp):
+    db_path = os.path.join(tmp, f"activity_{rows}.db")
+    dataset_path = os.path.join(tmp, f"dataset_{rows}")
+    fill(db_path, rows)
+
+    def read_sqlite():
+        conn = connect(db_path, readonly=True)
+        df = pd.read_sql_query("SELECT timestamp, status FROM playback_activity", conn)
+        conn.close()
+        return df
+
+    sqlite_read, _ = timed(read_sqlite)
+    full_export, _ = timed(lambda: export_activity(db_path, dataset_path))
+    parquet_read, df = timed(lambda: read_activity(dataset_path, columns=["timestamp", "status"]))
+    assert len(df) == rows
+
+    fill(db_path, 10000, start_id=rows + 1)
+    incremental_export, exported = timed(lambda: export_activity(db_path, dataset_path))
+    assert exported == 10000
+
+    print(f"{rows:>12,}{os.path.getsize(db_path) / 1e6:>10.0f} MB{directory_size(dataset_path) / 1e6:>10.0f} MB"
+          f"{sqlite_read:>12.2f}s{parquet_read:>12.2f}s{full_export:>12.2f}s{incremental_export:>14.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Parquet export against reading SQLite.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>12}{'sqlite':>13}{'parquet':>13}{'sqlite read':>13}{'parquet read':>13}"
+          f"{'full export':>13}{'+10k export':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            bench(rows, tmp)
+
+
+if __name__ == "__main__":
+    main()
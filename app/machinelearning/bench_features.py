@@ -0,0 +1,55 @@
+import argparse
+import os
+import tempfile
+from activity_export import export_activity, read_activity
+from bench_export import fill, timed
+from feature_store import FeatureStore
+
+# Training start-up (export + features) recomputed from scratch every run versus
+# the feature store, which only featurizes rows added since the last update.
+# Uses throwaway databases in a temp directory.
+# Run from machinelearning/: python bench_features.py --rows 1000000 10000000
+
+
+def from_scratch(db_path, dataset_path):
+    """The previous load_and_prepare_data: every feature recomputed, is_weekend row by row."""
+    export_activity(db_path, dataset_path)
+    df = read_activity(dataset_path, columns=["timestamp", "status"])
+    df["status"] = df["status"].astype(str)
+    df["hour"] = df["timestamp"].dt.hour
+    df["day_of_week"] = df["timestamp"].dt.dayofweek
+    df["is_weekend"] = df["day_of_week"].apply(lambda x: 1 if x >= 5 else 0)
+    return df
+
+
+def bench(rows, tmp):
+    db_path = os.path.join(tmp, f"activity_{rows}.db")
+    dataset_path = os.path.join(tmp, f"dataset_{rows}")
+    fill(db_path, rows)
+    store = FeatureStore(os.path.join(tmp, f"features_{rows}"), db_path, dataset_path)
+    store.update()
+
+    # The store's update exports the new rows, so from_scratch is timed on features alone
+    fill(db_path, 10000, start_id=rows + 1)
+    update, added = timed(store.update)
+    load, cached = timed(store.load)
+    scratch, df = timed(lambda: from_scratch(db_path, dataset_path))
+    assert added == 10000 and len(cached) == len(df) == rows + 10000
+    assert (cached["is_weekend"].to_numpy() == df["is_weekend"].to_numpy()).all()
+
+    print(f"{rows:>12,}{scratch:>14.2f}s{update:>14.3f}s{load:>12.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the feature store against recomputing features.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>12}{'from scratch':>15}{'+10k update':>15}{'load':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            bench(rows, tmp)
+
+
+if __name__ == "__main__":
+    main()
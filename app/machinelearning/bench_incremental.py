@@ -0,0 +1,47 @@
+import argparse
+import os
+import tempfile
+from bench_export import fill, timed
+from feature_store import FeatureStore
+from incremental_training import update_model, full_retrain
+from model_registry import ModelRegistry
+
+# Cost of bringing the model up to date after 10k new rows: an incremental
+# update against a full retrain, at several history sizes.
+# Uses throwaway databases in a temp directory.
+# Run from machinelearning/: python bench_incremental.py --rows 1000000 5000000
+
+
+def bench(rows, tmp, updates):
+    db_path = os.path.join(tmp, f"activity_{rows}.db")
+    fill(db_path, rows)
+    store = FeatureStore(os.path.join(tmp, f"features_{rows}"), db_path, os.path.join(tmp, f"dataset_{rows}"))
+    registry = ModelRegistry(os.path.join(tmp, f"registry_{rows}"))
+    update_model(store, registry)  # Initial full fit
+
+    next_id = rows + 1
+    for _ in range(updates):
+        fill(db_path, 10000, start_id=next_id)
+        next_id += 10000
+        seconds, outcome = timed(lambda: update_model(store, registry))
+        print(f"{rows:>12,}  {outcome['mode']:<12}{seconds:>8.2f}s  "
+              f"accuracy {registry.active().metadata['accuracy']:.3f}  ({outcome['reason']})")
+
+    fill(db_path, 10000, start_id=next_id)
+    seconds, _ = timed(lambda: full_retrain(store, registry, "benchmark"))
+    print(f"{rows:>12,}  {'full':<12}{seconds:>8.2f}s  accuracy {registry.active().metadata['accuracy']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark incremental model updates against full retrains.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--updates", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            bench(rows, tmp, args.updates)
+
+
+if __name__ == "__main__":
+    main()
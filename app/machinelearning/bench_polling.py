@@ -0,0 +1,72 @@
+import argparse
+import bisect
+import random
+from poll_schedule import AdaptivePollSchedule
+
+# Calls/hour and track capture rate of fixed-interval polling versus the
+# adaptive, track-boundary-aware schedule, on a simulated week of listening.
+# A track counts as captured when at least one poll lands while it plays.
+# Run from machinelearning/: python bench_polling.py --days 7
+
+
+def simulate_listening(days, rng):
+    """Return a sorted list of (start, end) seconds for every track played."""
+    tracks = []
+    t, end = 0.0, days * 86400
+    while t < end:
+        t += rng.uniform(1, 8) * 3600  # Idle gap between sessions
+        session_end = t + rng.uniform(0.5, 3) * 3600
+        while t < min(session_end, end):
+            duration = rng.uniform(150, 300)
+            played = duration * rng.uniform(0.1, 0.9) if rng.random() < 0.15 else duration  # Skips
+            tracks.append((t, t + played, duration))
+            t += played
+            if rng.random() < 0.05:
+                t += rng.uniform(30, 600)  # Short pause inside a session
+    return tracks, end
+
+
+def playback_at(tracks, starts, t):
+    """What currently-playing would report at time t, or None."""
+    i = bisect.bisect_right(starts, t) - 1
+    if i >= 0 and tracks[i][0] <= t < tracks[i][1]:
+        start, _, duration = tracks[i]
+        return i, {"is_playing": True, "progress_ms": (t - start) * 1000, "duration_ms": duration * 1000}
+    return None, None
+
+
+def run_policy(tracks, end, next_delay):
+    starts = [start for start, _, _ in tracks]
+    captured, calls, t = set(), 0, 0.0
+    while t < end:
+        calls += 1
+        index, playback = playback_at(tracks, starts, t)
+        if index is not None:
+            captured.add(index)
+        t += next_delay(playback)
+    return calls / (end / 3600), len(captured) / len(tracks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fixed and adaptive polling.")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tracks, end = simulate_listening(args.days, rng)
+    listening_hours = sum(stop - start for start, stop, _ in tracks) / 3600
+    print(f"{len(tracks)} tracks, {listening_hours:.1f} of {end / 3600:.0f} hours listening\n")
+
+    print(f"{'policy':<26}{'calls/hour':>12}{'captured':>10}")
+    for interval in (600, 120, 30, 10):
+        calls, rate = run_policy(tracks, end, lambda playback, interval=interval: interval)
+        print(f"{f'fixed {interval}s':<26}{calls:>12.1f}{rate:>10.1%}")
+    for idle_interval in (30, 10):
+        schedule = AdaptivePollSchedule(idle_interval=idle_interval, seed=args.seed)
+        calls, rate = run_policy(tracks, end, schedule.next_delay)
+        print(f"{f'adaptive (idle {idle_interval}s)':<26}{calls:>12.1f}{rate:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
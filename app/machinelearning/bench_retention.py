@@ -0,0 +1,101 @@
+import argparse
+import os
+import tempfile
+import time
+from threading import Thread, Event
+from activity_db import ActivityWriter, connect
+from retention import apply_retention
+
+# DB size and query time for a year of high-frequency polling, before and after
+# retention, plus how long the monitor's writer waits while retention runs.
+# Uses a throwaway database in a temp directory.
+# Run from machinelearning/: python bench_retention.py --days 365 --interval 30
+
+
+def fill(db_path, days, interval, now):
+    """Write one sample every `interval` seconds for `days` days, cycling through some tracks."""
+    tracks = [
+        {"id": f"track{i}", "uri": f"spotify:track:track{i}", "name": f"Song {i}", "duration_ms": 200000,
+         "artists": [{"id": f"artist{i % 40}", "name": f"Artist {i % 40}"}]}
+        for i in range(500)
+    ]
+    writer = ActivityWriter(db_path, batch_size=5000)
+    writer.start()
+    start = int(now - days * 86400)
+    for n, timestamp in enumerate(range(start, int(now), interval)):
+        if (timestamp // 3600) % 24 < 8:
+            writer.write("no_playback", timestamp=timestamp)
+        else:
+            writer.write("playing", tracks[(n * interval // 200) % len(tracks)], (n * interval % 200) * 1000,
+                         timestamp=timestamp)
+    writer.close()
+
+
+def measure(db_path, now):
+    size = sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal") if os.path.exists(db_path + suffix))
+    conn = connect(db_path, readonly=True)
+    timings = {}
+    for name, query, params in [
+        ("last 7 days", "SELECT status, COUNT(*) FROM playback_activity WHERE timestamp >= ? GROUP BY status",
+         (int(now - 7 * 86400),)),
+        ("training read", "SELECT timestamp, status FROM playback_activity", ()),
+        ("hourly buckets", "SELECT hour, status, samples FROM activity_hourly", ()),
+    ]:
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        timings[name] = time.perf_counter() - start
+    rows = conn.execute("SELECT COUNT(*) FROM playback_activity").fetchone()[0]
+    conn.close()
+    return size, rows, timings
+
+
+def report(label, size, rows, timings):
+    queries = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    print(f"{label:<18}{size / 1e6:>8.1f} MB {rows:>10,} raw rows   {queries}")
+
+
+def writer_stalls(db_path, stop):
+    """Max time a monitor-style write + flush waited while retention ran."""
+    writer = ActivityWriter(db_path, flush_interval=0.05)
+    writer.start()
+    worst = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        writer.write("no_playback")
+        writer.flush()
+        worst = max(worst, time.perf_counter() - start)
+        time.sleep(0.05)
+    writer.close()
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retention on a simulated year of polling.")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--interval", type=int, default=30, help="Seconds between samples.")
+    parser.add_argument("--max-age-days", type=float, default=30)
+    args = parser.parse_args()
+
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "activity_log.db")
+        start = time.perf_counter()
+        fill(db_path, args.days, args.interval, now)
+        print(f"Wrote {args.days} days at {args.interval}s intervals in {time.perf_counter() - start:.1f}s\n")
+        report("before retention", *measure(db_path, now))
+
+        stop, result = Event(), {}
+        watcher = Thread(target=lambda: result.update(stall=writer_stalls(db_path, stop)))
+        watcher.start()
+        stats = apply_retention(db_path, args.max_age_days, now=now, dataset_path=None)
+        stop.set()
+        watcher.join()
+
+        report("after retention", *measure(db_path, now))
+        print(f"\nRetention took {stats['seconds']:.1f}s ({stats['downsampled_rows']:,} rows, "
+              f"{stats['released_pages']:,} pages released); "
+              f"longest writer wait meanwhile {result['stall'] * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
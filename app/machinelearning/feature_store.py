@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import time
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+try:
+    from .activity_db import connect, STATUS_CODES, STATUS_NAMES
+    from .activity_export import export_activity, read_activity_after, read_watermark
+except ImportError:  # Run as a script from machinelearning/
+    from activity_db import connect, STATUS_CODES, STATUS_NAMES
+    from activity_export import export_activity, read_activity_after, read_watermark
+
+# Training features, computed once per activity row and cached on disk. Each
+# column is a flat binary file that new rows are appended to, so an update only
+# featurizes rows exported since the last one and loading is a memory map:
+#   feature_store/timestamp.i8, hour.i1, day_of_week.i1, is_weekend.i1, status.i1
+#   feature_store/_state.json   {"last_id", "rows"}
+# Run from machinelearning/: python feature_store.py
+DATABASE_PATH = "activity_log.db"
+DATASET_PATH = "activity_dataset"
+FEATURE_STORE_PATH = "feature_store"
+
+COLUMNS = {
+    "timestamp": np.int64,
+    "hour": np.int8,
+    "day_of_week": np.int8,
+    "is_weekend": np.int8,
+    "status": np.int8,
+}
+FEATURES = ["hour", "day_of_week", "is_weekend"]
+
+
+def compute_features(timestamps):
+    """
+    Calendar features for UTC Unix timestamps, with integer arithmetic only.
+
+    Args:
+        timestamps (numpy.ndarray): Unix times in seconds.
+
+    Returns:
+        dict: "hour", "day_of_week" (Monday = 0) and "is_weekend" int8 arrays.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    hour = (timestamps // 3600 % 24).astype(np.int8)
+    day_of_week = ((timestamps // 86400 + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday
+    return {"hour": hour, "day_of_week": day_of_week, "is_weekend": (day_of_week >= 5).astype(np.int8)}
+
+
+class FeatureStore:
+    def __init__(self, path=FEATURE_STORE_PATH, db_path=DATABASE_PATH, dataset_path=DATASET_PATH):
+        """
+        Cached training features over the exported activity dataset.
+
+        Args:
+            path (str): Directory holding the feature columns.
+            db_path (str): Path to the SQLite database file.
+            dataset_path (str): Directory of the Parquet export.
+        """
+        self.path = path
+        self.db_path = db_path
+        self.dataset_path = dataset_path
+
+    def state(self):
+        """Rows cached and the last activity id they cover; zeros for a new store."""
+        try:
+            with open(os.path.join(self.path, "_state.json"), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"last_id": 0, "rows": 0}
+
+    def _write_state(self, state):
+        path = os.path.join(self.path, "_state.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _column_path(self, name):
+        return os.path.join(self.path, f"{name}.{np.dtype(COLUMNS[name]).kind}{np.dtype(COLUMNS[name]).itemsize}")
+
+    def _append(self, state, timestamps, statuses, last_id):
+        """Append feature rows for `timestamps`, then advance the state past `last_id`."""
+        columns = compute_features(timestamps)
+        columns["timestamp"] = np.asarray(timestamps, dtype=np.int64)
+        columns["status"] = np.asarray(statuses, dtype=np.int8)
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(name), "ab") as f:
+                # Drop anything past the recorded row count, left there by an interrupted update
+                f.truncate(state["rows"] * np.dtype(dtype).itemsize)
+                columns[name].astype(dtype, copy=False).tofile(f)
+        state = {"last_id": last_id, "rows": state["rows"] + len(timestamps)}
+        self._write_state(state)
+        return state
+
+    def _hourly_backlog(self):
+        """Samples downsampled before the export began, as (timestamps, statuses) expanded from hourly counts."""
+        first_timestamp = read_watermark(self.dataset_path)["first_timestamp"]
+        conn = connect(self.db_path, readonly=True)
+        try:
+            rows = conn.execute(
+                "SELECT hour, status, samples FROM activity_hourly WHERE hour < ? ORDER BY hour",
+                (first_timestamp if first_timestamp is not None else 2**62,),
+            ).fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            return np.empty(0, np.int64), np.empty(0, np.int8)
+        hours, statuses, samples = (np.array(column, dtype=np.int64) for column in zip(*rows))
+        return np.repeat(hours, samples), np.repeat(statuses, samples).astype(np.int8)
+
+    def update(self):
+        """
+        Export new activity rows and featurize only those.
+
+        Returns:
+            int: Number of feature rows added.
+        """
+        export_activity(self.db_path, self.dataset_path)
+        os.makedirs(self.path, exist_ok=True)
+        state = self.state()
+        added = 0
+
+        if state["rows"] == 0:
+            timestamps, statuses = self._hourly_backlog()
+            if len(timestamps):
+                state = self._append(state, timestamps, statuses, state["last_id"])
+                added += len(timestamps)
+
+        table = read_activity_after(state["last_id"], self.dataset_path, columns=["id", "timestamp", "status"])
+        if table.num_rows:
+            table = table.sort_by("id")
+            timestamps = table["timestamp"].cast("int64").to_numpy()
+            statuses = table["status"].to_pandas().map(STATUS_CODES).to_numpy(dtype=np.int8)
+            state = self._append(state, timestamps, statuses, table["id"][-1].as_py())
+            added += table.num_rows
+        return added
+
+    def load(self, start=0):
+        """
+        The cached features as a DataFrame, memory-mapped.
+
+        Args:
+            start (int): First row to include, e.g. the row count a model was trained on.
+
+        Returns:
+            pandas.DataFrame: timestamp (Unix seconds), hour, day_of_week, is_weekend and
+            status (name) columns, in activity order, indexed by row number.
+        """
+        rows = self.state()["rows"]
+        start = min(start, rows)
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            itemsize = np.dtype(dtype).itemsize
+            columns[name] = (np.memmap(self._column_path(name), dtype=dtype, mode="r",
+                                       offset=start * itemsize, shape=(rows - start,))
+                             if rows > start else np.empty(0, dtype))
+        df = pd.DataFrame({name: columns[name] for name in ["timestamp"] + FEATURES},
+                          index=pd.RangeIndex(start, rows))
+        df["status"] = pd.Categorical.from_codes(
+            columns["status"], categories=[STATUS_NAMES[code] for code in sorted(STATUS_NAMES)]
+        )
+        return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Featurize activity rows added since the last update.")
+    parser.add_argument("--db-path", default=DATABASE_PATH)
+    parser.add_argument("--dataset-path", default=DATASET_PATH)
+    parser.add_argument("--store-path", default=FEATURE_STORE_PATH)
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store_path, args.db_path, args.dataset_path)
+    start = time.perf_counter()
+    added = store.update()
+    print(f"Featurized {added} new rows in {time.perf_counter() - start:.2f}s ({store.state()['rows']} cached).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,254 @@
-import sqlite3
-import pandas as pd # type: ignore
-from datetime import datetime, timedelta
-import random
+import argparse
+import time
+import numpy as np # type: ignore
+import pyarrow as pa # type: ignore
+from activity_db import connect, upgrade, register_accounts, RollupUpdater, STATUS_CODES
+from activity_export import SCHEMA, STATUS_DICTIONARY, append_table, read_watermark
 
+# Synthetic playback activity for scale tests, generated with NumPy a few days
+# at a time. Each account is polled every `interval` seconds (with jitter) and
+# listens in 15-minute sessions that follow a daily and weekly rhythm in its own
+# time zone: commute, lunch and a long evening on weekdays; a late start and
+# long afternoons at weekends. Tracks come from a shared catalog with Zipf-like
+# popularity and play back to back within a session, so progress and the
+# listening rollups stay consistent. The same seed and end time always give the
+# same data; the end defaults to a fixed anchor rather than now for that reason.
+# Run from machinelearning/: python generator.py --accounts 10 --days 365 --interval 30
+#   (about 10.5M rows; --parquet activity_dataset writes the training dataset instead)
 DATABASE_PATH = "activity_log.db"
+DEFAULT_END = 1767225600  # 2026-01-01 00:00 UTC
+
+SESSION_SECONDS = 900  # Each account decides whether to listen per 15-minute block
+TRACK_SLOT_SECONDS = 240  # Tracks within a session start every 4 minutes
+PAUSE_RATE = 0.06  # Share of track slots spent paused
+
+
+def _uniform(keys, salt):
+    """Deterministic uniform [0, 1) values for integer keys (splitmix64), so every sample of a block agrees."""
+    z = keys.astype(np.uint64) + np.uint64(salt * 0x9E3779B97F4A7C15 % 2**64)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def listening_probability(local_hour, weekend):
+    """Chance an account is listening at a (fractional) local hour, before its activity level."""
+    def bump(center, width, height):
+        return height * np.exp(-((local_hour - center) / width) ** 2)
+
+    weekday = 0.03 + bump(8.5, 1.0, 0.55) + bump(12.5, 1.0, 0.3) + bump(20.0, 2.5, 0.7)
+    weekend_day = 0.03 + bump(14.0, 3.5, 0.5) + bump(21.5, 2.0, 0.65)
+    return np.clip(np.where(weekend, weekend_day, weekday), 0, 0.95)
+
+
+class SyntheticCatalog:
+    def __init__(self, seed=0, tracks=2000, artists=300):
+        """
+        Tracks and artists shared by every synthetic account.
+
+        Args:
+            seed (int): Seed for durations and artist assignment.
+            tracks (int): Number of tracks.
+            artists (int): Number of artists; each track has one.
+        """
+        rng = np.random.default_rng([seed, 1])
+        self.names = np.array([f"Synthetic Song {i}" for i in range(tracks)])
+        self.artist_names = np.array([f"Synthetic Artist {i}" for i in range(artists)])
+        self.track_artist = rng.integers(0, artists, tracks)
+        self.duration_ms = rng.integers(150_000, 300_000, tracks)
+        popularity = 1 / np.arange(1, tracks + 1) ** 1.1
+        self.cdf = np.cumsum(popularity) / popularity.sum()
+
+    def pick(self, u):
+        """Track indices for uniform draws `u`, weighted by popularity."""
+        return np.minimum(np.searchsorted(self.cdf, u), len(self.cdf) - 1)
+
+
+def generate_activity(accounts=1, days=30, interval=30, seed=0, end=None, chunk_days=7, catalog=None):
+    """
+    Yield synthetic activity a chunk of days at a time, in timestamp order.
+
+    Args:
+        accounts (int): Number of accounts polled side by side.
+        days (int): Days of history, ending at `end`.
+        interval (int): Seconds between polls of one account.
+        seed (int): Seed for every random choice.
+        end (int): Unix time the history ends at; defaults to DEFAULT_END.
+        chunk_days (int): Days generated per chunk, which bounds memory use.
+        catalog (SyntheticCatalog): Tracks to play; built from `seed` if omitted.
+
+    Yields:
+        dict: "timestamp", "status", "account" (index), "track" (catalog index,
+        -1 when nothing is loaded) and "progress_ms" arrays of equal length.
+    """
+    rng = np.random.default_rng(seed)
+    catalog = catalog or SyntheticCatalog(seed)
+    utc_offsets = rng.integers(-8, 10, accounts) * 3600
+    levels = rng.uniform(0.6, 1.3, accounts)
+
+    end = int(end or DEFAULT_END)
+    start = end - days * 86400
+    for chunk_start in range(start, end, chunk_days * 86400):
+        base = np.arange(chunk_start, min(chunk_start + chunk_days * 86400, end), interval)
+        timestamps = np.concatenate([base + rng.integers(0, max(interval // 4, 1), len(base))
+                                     for _ in range(accounts)])
+        account = np.repeat(np.arange(accounts), len(base))
+
+        local = timestamps + utc_offsets[account]
+        block = local // SESSION_SECONDS
+        block_hour = (block * SESSION_SECONDS % 86400 + SESSION_SECONDS / 2) / 3600
+        weekend = (local // 86400 + 3) % 7 >= 5  # 1970-01-01 was a Thursday
+        listening = _uniform(block * accounts + account, seed) < levels[account] * listening_probability(
+            block_hour, weekend
+        )
+
+        elapsed = local - block * SESSION_SECONDS
+        slot_key = (block * (SESSION_SECONDS // TRACK_SLOT_SECONDS + 1) + elapsed // TRACK_SLOT_SECONDS) * accounts + account
+        track = catalog.pick(_uniform(slot_key, seed + 1))
+        paused = _uniform(slot_key, seed + 2) < PAUSE_RATE
+
+        status = np.where(listening, np.where(paused, STATUS_CODES["paused"], STATUS_CODES["playing"]),
+                          STATUS_CODES["no_playback"])
+        progress_ms = np.minimum(elapsed % TRACK_SLOT_SECONDS * 1000, catalog.duration_ms[track] - 1)
+
+        order = np.argsort(timestamps, kind="stable")
+        yield {
+            "timestamp": timestamps[order],
+            "status": status[order].astype(np.int8),
+            "account": account[order],
+            "track": np.where(listening, track, -1)[order],
+            "progress_ms": np.where(listening, progress_ms, -1)[order],
+        }
+
+
+def _nullable(values):
+    """Python list with -1 entries replaced by None, for executemany."""
+    column = values.astype(object)
+    column[values < 0] = None
+    return column.tolist()
+
+
+def load_sqlite(chunks, catalog, accounts, db_path=DATABASE_PATH, rollups=True):
+    """
+    Bulk-insert generated chunks into the activity database, one transaction per chunk.
+
+    Args:
+        chunks (iterable): Output of generate_activity.
+        catalog (SyntheticCatalog): The catalog the chunks were generated from.
+        accounts (int): Number of accounts in the chunks.
+        db_path (str): Path to the SQLite database file.
+        rollups (bool): Fold the rows into the listening rollups as they go in.
+
+    Returns:
+        int: Rows inserted.
+    """
+    upgrade(db_path)
+    account_names = [f"synthetic-{i + 1}" for i in range(accounts)]
+    registered = register_accounts(db_path, account_names)
+    account_ids = np.array([registered[name] for name in account_names])
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO artists (spotify_id, name) VALUES (?, ?)",
+                             [(f"synthetic-artist-{i}", name) for i, name in enumerate(catalog.artist_names)])
+            artist_ids = dict(conn.execute("SELECT spotify_id, id FROM artists WHERE spotify_id LIKE 'synthetic-%'"))
+            conn.executemany("""
+                INSERT OR IGNORE INTO tracks (spotify_id, name, artist_names, duration_ms) VALUES (?, ?, ?, ?)
+            """, [(f"synthetic-track-{i}", name, catalog.artist_names[catalog.track_artist[i]],
+                   int(catalog.duration_ms[i])) for i, name in enumerate(catalog.names)])
+            spotify_track_ids = dict(conn.execute("SELECT spotify_id, id FROM tracks WHERE spotify_id LIKE 'synthetic-%'"))
+            track_ids = np.array([spotify_track_ids[f"synthetic-track-{i}"] for i in range(len(catalog.names))])
+            conn.executemany("INSERT OR IGNORE INTO track_artists (track_id, position, artist_id) VALUES (?, 0, ?)", [
+                (int(track_ids[i]), artist_ids[f"synthetic-artist-{artist}"])
+                for i, artist in enumerate(catalog.track_artist)
+            ])
+
+        updater = RollupUpdater()
+        inserted = 0
+        for chunk in chunks:
+            loaded = chunk["track"] >= 0
+            columns = [
+                chunk["timestamp"].tolist(),
+                chunk["status"].tolist(),
+                _nullable(np.where(loaded, track_ids[chunk["track"]], -1)),
+                _nullable(chunk["progress_ms"]),
+                account_ids[chunk["account"]].tolist(),
+            ]
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("""
+                    INSERT INTO playback_activity (timestamp, status, track_id, progress_ms, account_id)
+                    VALUES (?, ?, ?, ?, ?)
+                """, zip(*columns))
+                if rollups:
+                    durations = _nullable(np.where(loaded, catalog.duration_ms[chunk["track"]], -1))
+                    updater.apply(conn, list(zip(*columns[:4], durations, columns[4])))
+            inserted += len(columns[0])
+        return inserted
+    finally:
+        conn.close()
+
+
+def load_parquet(chunks, catalog, dataset_path):
+    """
+    Append generated chunks straight to a Parquet activity dataset, without a database.
+
+    Account ids are the account indexes plus one and track ids the catalog indexes plus one.
+
+    Returns:
+        int: Rows written.
+    """
+    track_names = pa.array(catalog.names)
+    artist_names = pa.array(catalog.artist_names)
+    next_id = read_watermark(dataset_path)["last_id"] + 1
+    written = 0
+    for chunk in chunks:
+        rows = len(chunk["timestamp"])
+        empty = chunk["track"] < 0
+        track = np.where(empty, 0, chunk["track"])
+        table = pa.Table.from_arrays([
+            pa.array(np.arange(next_id, next_id + rows), pa.int64()),
+            pa.array(chunk["timestamp"], pa.int64()).cast(pa.timestamp("s", tz="UTC")),
+            pa.DictionaryArray.from_arrays(pa.array(chunk["status"], pa.int8()), STATUS_DICTIONARY),
+            pa.array(chunk["account"] + 1, pa.int32()),
+            pa.array(track + 1, pa.int32(), mask=empty),
+            pa.DictionaryArray.from_arrays(pa.array(track, pa.int32(), mask=empty), track_names),
+            pa.DictionaryArray.from_arrays(pa.array(catalog.track_artist[track], pa.int32(), mask=empty), artist_names),
+            pa.array(chunk["progress_ms"], pa.int32(), mask=empty),
+            pa.array(catalog.duration_ms[track], pa.int32(), mask=empty),
+            pa.nulls(rows, pa.int32()),
+        ], schema=SCHEMA)
+        append_table(table, dataset_path)
+        next_id += rows
+        written += rows
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic playback activity.")
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--interval", type=int, default=30, help="Seconds between polls of one account.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--end", type=int, default=DEFAULT_END,
+                        help="Unix time the history ends at (default 2026-01-01 UTC); pass $(date +%%s) for now.")
+    parser.add_argument("--db-path", default=DATABASE_PATH)
+    parser.add_argument("--parquet", metavar="DATASET_PATH", help="Write a Parquet dataset instead of SQLite.")
+    parser.add_argument("--no-rollups", action="store_true", help="Skip the listening rollups (faster loads).")
+    args = parser.parse_args()
+
+    catalog = SyntheticCatalog(args.seed)
+    chunks = generate_activity(args.accounts, args.days, args.interval, args.seed, args.end, catalog=catalog)
+    start = time.perf_counter()
+    if args.parquet:
+        rows = load_parquet(chunks, catalog, args.parquet)
+        target = args.parquet
+    else:
+        rows = load_sqlite(chunks, catalog, args.accounts, args.db_path, rollups=not args.no_rollups)
+        target = args.db_path
+    print(f"Generated {rows:,} rows in {target} in {time.perf_counter() - start:.1f}s.")
 
-def generate_sample_data(num_entries=1000):
-    """Generate synthetic playback activity data."""
-    start_time = datetime.now() - timedelta(days=30)  # Start 30 days ago
-    statuses = ["playing", "paused", "no_playback"]
-    sample_data = []
-
-    for _ in range(num_entries):
-        timestamp = start_time + timedelta(minutes=random.randint(1, 1440))  # Random minute
-        status = random.choice(statuses)
-        song_name = f"Song {random.randint(1, 100)}" if status == "playing" else None
-        artist_name = f"Artist {random.randint(1, 50)}" if status == "playing" else None
-        sample_data.append((timestamp, status, song_name, artist_name))
-
-    # Insert into database
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.executemany("""
-        INSERT INTO playback_activity (timestamp, status, song_name, artist_name)
-        VALUES (?, ?, ?, ?)
-    """, sample_data)
-    conn.commit()
-    conn.close()
-    print(f"Generated {num_entries} sample entries in {DATABASE_PATH}.")
 
 if __name__ == "__main__":
-    generate_sample_data()
+    main()
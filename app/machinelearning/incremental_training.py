@@ -0,0 +1,166 @@
+import argparse
+import time
+import numpy as np # type: ignore
+import lightgbm as lgb # type: ignore
+from sklearn.preprocessing import LabelEncoder # type: ignore
+
+try:
+    from .feature_store import FeatureStore, FEATURES
+    from .model_registry import ModelRegistry
+    from .model_training import (load_and_prepare_data, train_and_evaluate_model, evaluate_model,
+                                 DATABASE_PATH, DATASET_PATH, FEATURE_STORE_PATH, REGISTRY_PATH)
+except ImportError:  # Run as a script from machinelearning/
+    from feature_store import FeatureStore, FEATURES
+    from model_registry import ModelRegistry
+    from model_training import (load_and_prepare_data, train_and_evaluate_model, evaluate_model,
+                                DATABASE_PATH, DATASET_PATH, FEATURE_STORE_PATH, REGISTRY_PATH)
+
+# Keeps the registered activity model current without refitting the whole
+# history. An update continues boosting the active LightGBM model on only the
+# feature rows added since it was trained ("feature_rows" in its metadata),
+# validated on the newest slice of those rows. It falls back to a full retrain:
+#   - when there is no incremental base (legacy or pickled model, unknown rows, a new status)
+#   - every `full_retrain_every` updates, so the tree count doesn't grow without bound
+#   - on drift: the active model scores `drift_tolerance` below its recorded accuracy
+#     on the new rows, or the updated model scores that much below the active one
+# Run from machinelearning/: python incremental_training.py
+CONTINUED_PARAMS = ("objective", "num_class", "learning_rate", "num_leaves", "max_depth", "min_data_in_leaf", "seed")
+
+
+def _encode(statuses, classes):
+    """Status names as indices into the model's `classes`, or None if one of them is unknown to it."""
+    classes = list(classes)
+    lookup = np.array([classes.index(name) if name in classes else -1 for name in statuses.cat.categories])
+    encoded = lookup[statuses.cat.codes]
+    return None if (encoded < 0).any() else encoded
+
+
+def continue_training(booster, X_train, y_train, X_valid, y_valid, rounds=50, early_stopping_rounds=10):
+    """
+    Add up to `rounds` boosting rounds to `booster`, fitted to the new rows only.
+
+    Returns:
+        lightgbm.Booster: A new booster; `booster` itself is left unchanged.
+    """
+    params = {key: booster.params[key] for key in CONTINUED_PARAMS if key in booster.params}
+    params["verbosity"] = -1
+    train_set = lgb.Dataset(X_train, label=y_train)
+    valid_set = lgb.Dataset(X_valid, label=y_valid, reference=train_set)
+    return lgb.train(
+        params, train_set, num_boost_round=rounds, init_model=booster, valid_sets=[valid_set],
+        callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)],
+    )
+
+
+def full_retrain(store, registry, reason, extra=None):
+    """Refit on every feature row and register the result as a new base version."""
+    print(f"Full retrain ({reason})...")
+    X_train, X_test, y_train, y_test, label_encoder = load_and_prepare_data(store)
+    model = train_and_evaluate_model(X_train, X_test, y_train, y_test)
+    metadata = evaluate_model(model, X_test, y_test)
+    metadata.update(extra or {})
+    metadata.update({
+        "training_rows": len(X_train),
+        "feature_rows": len(X_train) + len(X_test),
+        "mode": "full",
+        "reason": reason,
+        "incremental_updates": 0,
+    })
+    return registry.save(model, label_encoder, metadata), len(X_train) + len(X_test)
+
+
+def update_model(store, registry, full_retrain_every=10, drift_tolerance=0.05, validation_fraction=0.2,
+                 min_new_rows=1000, rounds=50):
+    """
+    Bring the active model up to date with the rows logged since it was trained.
+
+    Args:
+        store (FeatureStore): Feature store to read rows from.
+        registry (ModelRegistry): Registry holding the active model; receives the new version.
+        full_retrain_every (int): Incremental updates allowed before a full retrain.
+        drift_tolerance (float): Accuracy drop on the new rows that forces a full retrain.
+        validation_fraction (float): Newest share of the new rows held out for the checks.
+        min_new_rows (int): Fewer new rows than this leaves the model as it is.
+        rounds (int): Most boosting rounds added per update.
+
+    Returns:
+        dict: "mode" ("full", "incremental" or "skipped"), "version", "rows" trained on,
+        "reason" and "seconds".
+    """
+    start = time.perf_counter()
+    store.update()
+    active = registry.active() if registry.active_version() is not None else None
+    base_rows = active.metadata.get("feature_rows") if active else None
+
+    def result(mode, version, rows, reason):
+        return {"mode": mode, "version": version, "rows": rows, "reason": reason,
+                "seconds": time.perf_counter() - start}
+
+    def retrain(reason, extra=None):
+        version, rows = full_retrain(store, registry, reason, extra)
+        return result("full", version, rows, reason)
+
+    if active is None or active.booster is None or base_rows is None:
+        return retrain("no incremental base")
+
+    new = store.load(start=base_rows)
+    if len(new) < min_new_rows:
+        return result("skipped", active.version, 0, f"only {len(new)} new rows")
+    updates = active.metadata.get("incremental_updates", 0)
+    if updates >= full_retrain_every:
+        return retrain(f"{updates} incremental updates since the last full retrain")
+    y = _encode(new["status"], active.classes)
+    if y is None:
+        return retrain("new status in the activity log")
+
+    # Hold out the newest rows: the checks ask how well each model predicts what comes next
+    split = int(len(new) * (1 - validation_fraction))
+    X = new[FEATURES]
+    X_train, X_valid, y_train, y_valid = X.iloc[:split], X.iloc[split:], y[:split], y[split:]
+
+    previous = evaluate_model(active.booster, X_valid, y_valid)["accuracy"]
+    drift = {"previous_accuracy": previous, "recorded_accuracy": active.metadata.get("accuracy")}
+    if drift["recorded_accuracy"] is not None and previous < drift["recorded_accuracy"] - drift_tolerance:
+        return retrain("drift: active model lost accuracy on new rows", drift)
+
+    booster = continue_training(active.booster, X_train, y_train, X_valid, y_valid, rounds)
+    metadata = evaluate_model(booster, X_valid, y_valid)
+    if metadata["accuracy"] < previous - drift_tolerance:
+        return retrain("drift: incremental update scored below the active model", drift)
+
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = active.classes
+    metadata.update(drift)
+    metadata.update({
+        "training_rows": len(X_train),
+        "feature_rows": base_rows + len(new),
+        "mode": "incremental",
+        "base_version": active.version,
+        "incremental_updates": updates + 1,
+    })
+    version = registry.save(booster, label_encoder, metadata)
+    return result("incremental", version, len(new), f"{len(new)} new rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the activity model with newly logged rows.")
+    parser.add_argument("--full", action="store_true", help="Refit on the full history instead.")
+    parser.add_argument("--full-retrain-every", type=int, default=10)
+    parser.add_argument("--drift-tolerance", type=float, default=0.05)
+    parser.add_argument("--min-new-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    store = FeatureStore(FEATURE_STORE_PATH, DATABASE_PATH, DATASET_PATH)
+    registry = ModelRegistry(REGISTRY_PATH)
+    if args.full:
+        version, rows = full_retrain(store, registry, "requested")
+        print(f"Registered version {version} trained on {rows} rows.")
+        return
+    outcome = update_model(store, registry, args.full_retrain_every, args.drift_tolerance,
+                           min_new_rows=args.min_new_rows)
+    print(f"{outcome['mode'].capitalize()} ({outcome['reason']}): version {outcome['version']}, "
+          f"{outcome['rows']} rows in {outcome['seconds']:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
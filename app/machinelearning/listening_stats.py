@@ -0,0 +1,139 @@
+import json
+import time
+
+try:
+    from .activity_db import connect, upgrade, schema_version, DEFAULT_ACCOUNT_ID, SCHEMA_VERSION
+except ImportError:  # Run as a script from machinelearning/
+    from activity_db import connect, upgrade, schema_version, DEFAULT_ACCOUNT_ID, SCHEMA_VERSION
+
+# Read-only queries over the rollup tables the ActivityWriter maintains. Every
+# query is a handful of primary-key or index lookups, so its cost doesn't
+# grow with the size of the raw playback log.
+DATABASE_PATH = "activity_log.db"
+
+
+class StatsUnavailableError(Exception):
+    """Raised when the database hasn't been upgraded to the schema the rollup queries need."""
+
+
+def open_stats(db_path=DATABASE_PATH):
+    """
+    Open a read-only connection for the queries below.
+
+    Never migrates, so it is cheap enough for the GUI thread; run
+    activity_db.upgrade first (the app does so at startup, off the GUI thread).
+
+    Raises:
+        StatsUnavailableError: The database is still on an older schema.
+    """
+    conn = connect(db_path, readonly=True)
+    if schema_version(conn) < SCHEMA_VERSION:
+        conn.close()
+        raise StatsUnavailableError(f"{db_path} needs upgrading before its rollups can be read.")
+    return conn
+
+
+def load_boost_list(preferences_path):
+    """Song names from the preferences file the GUI saves."""
+    with open(preferences_path, "r") as f:
+        return json.load(f).get("songs", [])
+
+
+def boost_progress(conn, songs, account_id=DEFAULT_ACCOUNT_ID, year=None):
+    """
+    Plays and listening minutes this year for each song on the boost list.
+
+    Songs are matched by name (case-insensitively) and summed over every
+    track with that name, since the preferences file only holds names.
+    CROSS JOIN keeps SQLite on the name index first, so each song costs
+    two index lookups however long the year's rollup is.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the activity database.
+        songs (list): Song names from the boost list.
+        account_id (int): Account to report on.
+        year (int): Calendar year (UTC); defaults to the current one.
+
+    Returns:
+        list: {"song", "plays", "minutes"} dicts in boost-list order.
+    """
+    year = year or time.gmtime().tm_year
+    progress = []
+    for song in songs:
+        plays, listened_ms = conn.execute("""
+            SELECT COALESCE(SUM(r.plays), 0), COALESCE(SUM(r.listened_ms), 0)
+            FROM tracks t
+            CROSS JOIN track_rollup r ON r.account_id = ? AND r.year = ? AND r.track_id = t.id
+            WHERE t.name = ? COLLATE NOCASE
+        """, (account_id, year, song)).fetchone()
+        progress.append({"song": song, "plays": plays, "minutes": listened_ms / 60000})
+    return progress
+
+
+def top_tracks(conn, account_id=DEFAULT_ACCOUNT_ID, year=None, limit=10):
+    """The most-listened tracks of the year as {"song", "artist", "plays", "minutes"} dicts."""
+    year = year or time.gmtime().tm_year
+    rows = conn.execute("""
+        SELECT t.name, t.artist_names, r.plays, r.listened_ms
+        FROM track_rollup r
+        JOIN tracks t ON t.id = r.track_id
+        WHERE r.account_id = ? AND r.year = ?
+        ORDER BY r.listened_ms DESC, r.plays DESC
+        LIMIT ?
+    """, (account_id, year, limit)).fetchall()
+    return [
+        {"song": name, "artist": artist_names, "plays": plays, "minutes": listened_ms / 60000}
+        for name, artist_names, plays, listened_ms in rows
+    ]
+
+
+def top_artists(conn, account_id=DEFAULT_ACCOUNT_ID, year=None, limit=10):
+    """The most-listened artists of the year as {"artist", "plays", "minutes"} dicts."""
+    year = year or time.gmtime().tm_year
+    rows = conn.execute("""
+        SELECT a.name, r.plays, r.listened_ms
+        FROM artist_rollup r
+        JOIN artists a ON a.id = r.artist_id
+        WHERE r.account_id = ? AND r.year = ?
+        ORDER BY r.listened_ms DESC, r.plays DESC
+        LIMIT ?
+    """, (account_id, year, limit)).fetchall()
+    return [{"artist": name, "plays": plays, "minutes": listened_ms / 60000} for name, plays, listened_ms in rows]
+
+
+def listening_by_hour(conn, start, end, account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Hourly totals between two Unix times, for charts.
+
+    Returns:
+        list: (hour_start, samples, playing_samples, plays, listened_ms) tuples; hours with no samples are absent.
+    """
+    return conn.execute("""
+        SELECT hour, samples, playing_samples, plays, listened_ms
+        FROM hourly_rollup
+        WHERE account_id = ? AND hour >= ? AND hour < ?
+        ORDER BY hour
+    """, (account_id, start - start % 3600, end)).fetchall()
+
+
+def listening_by_day(conn, start, end, account_id=DEFAULT_ACCOUNT_ID):
+    """Daily (UTC) totals between two Unix times as (day, plays, listened_ms) tuples."""
+    return conn.execute("""
+        SELECT date(hour, 'unixepoch') AS day, SUM(plays), SUM(listened_ms)
+        FROM hourly_rollup
+        WHERE account_id = ? AND hour >= ? AND hour < ?
+        GROUP BY day
+        ORDER BY day
+    """, (account_id, start - start % 3600, end)).fetchall()
+
+
+def main():
+    upgrade(DATABASE_PATH)
+    conn = open_stats()
+    for entry in boost_progress(conn, load_boost_list("../user_preferences.json")):
+        print(f"{entry['song']}: {entry['plays']} plays, {entry['minutes']:.1f} minutes")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import json
+import os
+import shutil
+import time
+from threading import Lock
+import joblib # type: ignore
+import lightgbm as lgb # type: ignore
+import numpy as np # type: ignore
+import pandas as pd # type: ignore
+
+try:
+    from .feature_store import FEATURES, compute_features
+except ImportError:  # Run as a script from machinelearning/
+    from feature_store import FEATURES, compute_features
+
+# Versioned store of trained activity models:
+#   saved_models/registry/v0001/model.txt       LightGBM booster, native text format
+#   saved_models/registry/v0001/metadata.json   classes, features, training rows, metrics, ...
+#   saved_models/registry/v0001/week_table.npy  class probabilities for every hour of the week
+#   saved_models/registry/ACTIVE                 {"version": 1}
+# The GUI, incremental_training.py and model_tuning.py save from separate
+# processes, so a version number is claimed with os.mkdir, which only one of
+# them can win. The files are written elsewhere and moved in with metadata.json
+# last, readers skip versions without one, and switching versions is a single
+# os.replace of ACTIVE, so readers only ever see a whole model. Models that
+# aren't LightGBM fall back to a joblib pickle.
+#
+# When every feature is a function of the time of week (true of the calendar
+# features today), the model is evaluated once per week slot at save time and
+# predictions by timestamp become an array lookup.
+REGISTRY_PATH = "saved_models/registry"
+LEGACY_MODEL_PATH = "saved_models/activity_model.pkl"
+
+WEEK_SECONDS = 7 * 86400
+WEEK_START = 4 * 86400  # 1970-01-05 00:00 UTC, a Monday
+TABLE_SLOT_SECONDS = 3600  # Finest resolution any calendar feature needs
+CALENDAR_FEATURES = set(compute_features(np.zeros(1, np.int64)))
+
+
+def week_slot(timestamps):
+    """Index of each Unix timestamp's slot in the week table."""
+    return (np.asarray(timestamps, dtype=np.int64) - WEEK_START) % WEEK_SECONDS // TABLE_SLOT_SECONDS
+
+
+class LoadedModel:
+    def __init__(self, metadata, booster=None, model=None, label_encoder=None, week_table=None):
+        """
+        A registered model held in memory, predicting status names directly.
+
+        Args:
+            metadata (dict): The version's metadata.
+            booster (lightgbm.Booster): Native model, for the "lightgbm" format.
+            model: Fitted estimator, for the "joblib" format.
+            label_encoder (LabelEncoder): Encoder saved with the joblib model.
+            week_table (numpy.ndarray): Probabilities per week slot, if the features allow one.
+        """
+        self.metadata = metadata
+        self.version = metadata.get("version")
+        self.features = metadata["features"]
+        self.classes = np.asarray(metadata["classes"])
+        self.booster = booster
+        self.model = model
+        self.label_encoder = label_encoder
+        self.week_table = week_table
+        self.week_labels = None if week_table is None else self.classes[np.argmax(week_table, axis=1)]
+
+    def enumerable(self):
+        """Whether every feature depends only on the time of week, so a week table covers all inputs."""
+        return set(self.features) <= CALENDAR_FEATURES
+
+    def build_week_table(self):
+        """Evaluate the model once per week slot; returns (slots, classes) float32 probabilities."""
+        slots = WEEK_START + np.arange(WEEK_SECONDS // TABLE_SLOT_SECONDS) * TABLE_SLOT_SECONDS
+        return self.predict_proba(pd.DataFrame(compute_features(slots))).astype(np.float32)
+
+    def predict_proba(self, X):
+        """Class probabilities, one column per entry of `classes`."""
+        if self.booster is None:
+            return self.model.predict_proba(X[self.features])
+        probabilities = self.booster.predict(X[self.features])
+        if probabilities.ndim == 1:  # Binary models return only the positive class
+            probabilities = np.column_stack([1 - probabilities, probabilities])
+        return probabilities
+
+    def predict(self, X):
+        """Predicted status names for each row of `X`."""
+        if self.booster is None:
+            return self.label_encoder.inverse_transform(self.model.predict(X[self.features]))
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_proba_at(self, timestamps):
+        """Class probabilities for Unix timestamps, from the week table when there is one."""
+        if self.week_table is None:
+            return self.predict_proba(pd.DataFrame(compute_features(timestamps)))
+        return self.week_table[week_slot(timestamps)]
+
+    def predict_at(self, timestamps):
+        """Predicted status names for Unix timestamps, from the week table when there is one."""
+        if self.week_labels is None:
+            return self.predict(pd.DataFrame(compute_features(timestamps)))
+        return self.week_labels[week_slot(timestamps)]
+
+
+class ModelRegistry:
+    def __init__(self, path=REGISTRY_PATH, legacy_model_path=LEGACY_MODEL_PATH):
+        """
+        Versioned models on disk, with the active one cached in memory.
+
+        Args:
+            path (str): Directory holding the versions.
+            legacy_model_path (str): Pickle served while no version is registered yet.
+        """
+        self.path = path
+        self.legacy_model_path = legacy_model_path
+        self._lock = Lock()
+        self._active = None
+
+    def _version_path(self, version):
+        return os.path.join(self.path, f"v{version:04d}")
+
+    def _version_names(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.startswith("v") and name[1:].isdigit())
+
+    def versions(self):
+        """Metadata of every registered version, oldest first (versions still being saved are skipped)."""
+        versions = []
+        for name in self._version_names():
+            try:
+                with open(os.path.join(self.path, name, "metadata.json"), "r") as f:
+                    versions.append(json.load(f))
+            except FileNotFoundError:
+                continue
+        return versions
+
+    def active_version(self):
+        """Number of the active version, or None before anything is registered."""
+        try:
+            with open(os.path.join(self.path, "ACTIVE"), "r") as f:
+                return json.load(f)["version"]
+        except FileNotFoundError:
+            return None
+
+    def activate(self, version):
+        """Make `version` the one served by active(); takes effect atomically."""
+        if not os.path.isfile(os.path.join(self._version_path(version), "metadata.json")):
+            raise ValueError(f"Model version {version} is not registered")
+        path = os.path.join(self.path, "ACTIVE")
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # Per process, as several may activate at once
+        with open(tmp_path, "w") as f:
+            json.dump({"version": version}, f)
+        os.replace(tmp_path, path)
+
+    def _claim_version(self):
+        """Reserve the next free version number by creating its directory."""
+        names = self._version_names()
+        version = int(names[-1][1:]) + 1 if names else 1
+        while True:
+            try:
+                os.mkdir(self._version_path(version))
+                return version
+            except FileExistsError:  # Another process claimed it first
+                version += 1
+
+    def save(self, model, label_encoder, metadata=None, activate=True):
+        """
+        Register a trained model as a new version.
+
+        Args:
+            model: Fitted LGBMClassifier or lightgbm.Booster (stored natively), or any
+                other estimator (pickled).
+            label_encoder (LabelEncoder): Encoder for the status labels.
+            metadata (dict): Extra fields to keep, e.g. training rows and metrics.
+            activate (bool): Serve the new version straight away.
+
+        Returns:
+            int: The new version number.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with self._lock:
+            version = self._claim_version()
+            final_path = self._version_path(version)
+            tmp_path = os.path.join(self.path, f".v{version:04d}.tmp")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+
+            info = dict(metadata or {})
+            info.update({
+                "version": version,
+                "created_at": time.time(),
+                "classes": [str(name) for name in label_encoder.classes_],
+            })
+            if isinstance(model, (lgb.LGBMClassifier, lgb.Booster)):
+                booster = model if isinstance(model, lgb.Booster) else model.booster_
+                info["format"] = "lightgbm"
+                info["features"] = booster.feature_name()
+                if isinstance(model, lgb.LGBMClassifier):
+                    info["params"] = {key: value for key, value in model.get_params().items()
+                                      if isinstance(value, (int, float, str, bool, type(None)))}
+                booster.save_model(os.path.join(tmp_path, "model.txt"))
+                loaded = LoadedModel(info, booster=booster)
+            else:
+                info["features"] = [str(name) for name in model.feature_names_in_]
+                info["format"] = "joblib"
+                joblib.dump((model, label_encoder), os.path.join(tmp_path, "model.pkl"))
+                loaded = LoadedModel(info, model=model, label_encoder=label_encoder)
+
+            if loaded.enumerable():
+                np.save(os.path.join(tmp_path, "week_table.npy"), loaded.build_week_table())
+                info["week_table"] = {"slot_seconds": TABLE_SLOT_SECONDS, "week_start": WEEK_START}
+            with open(os.path.join(tmp_path, "metadata.json"), "w") as f:
+                json.dump(info, f, indent=4)
+
+            # metadata.json goes last: it marks the version as complete
+            for name in sorted(os.listdir(tmp_path), key=lambda name: name == "metadata.json"):
+                os.replace(os.path.join(tmp_path, name), os.path.join(final_path, name))
+            os.rmdir(tmp_path)
+            if activate:
+                self.activate(version)
+        return version
+
+    def load(self, version):
+        """Load a registered version from disk."""
+        path = self._version_path(version)
+        with open(os.path.join(path, "metadata.json"), "r") as f:
+            metadata = json.load(f)
+        week_table = None
+        if metadata.get("week_table", {}).get("slot_seconds") == TABLE_SLOT_SECONDS:
+            week_table = np.load(os.path.join(path, "week_table.npy"))
+        if metadata["format"] == "lightgbm":
+            booster = lgb.Booster(model_file=os.path.join(path, "model.txt"))
+            return LoadedModel(metadata, booster=booster, week_table=week_table)
+        model, label_encoder = joblib.load(os.path.join(path, "model.pkl"))
+        return LoadedModel(metadata, model=model, label_encoder=label_encoder, week_table=week_table)
+
+    def _load_legacy(self):
+        model, label_encoder = joblib.load(self.legacy_model_path)
+        metadata = {
+            "version": None,
+            "format": "joblib",
+            "classes": [str(name) for name in label_encoder.classes_],
+            "features": FEATURES,
+        }
+        return LoadedModel(metadata, model=model, label_encoder=label_encoder)
+
+    def active(self):
+        """
+        The active model, loaded once and kept in memory.
+
+        Reads the ACTIVE pointer on each call, so a version saved by
+        another process is picked up without a restart.
+
+        Returns:
+            LoadedModel: The active model, or the legacy pickle if nothing is registered yet.
+        """
+        version = self.active_version()
+        with self._lock:
+            if self._active is None or self._active.version != version:
+                # Swap in the new model only once it has fully loaded
+                self._active = self.load(version) if version is not None else self._load_legacy()
+            return self._active
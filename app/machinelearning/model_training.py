@@ -1,36 +1,42 @@
-import sqlite3
 import pandas as pd # type: ignore
 from sklearn.model_selection import train_test_split # type: ignore
 from sklearn.preprocessing import LabelEncoder # type: ignore
 import lightgbm as lgb # type: ignore
 from sklearn.metrics import classification_report # type: ignore
-import joblib # type: ignore
 
-# Database and model paths
+try:
+    from .feature_store import FeatureStore, FEATURES
+    from .model_registry import ModelRegistry
+except ImportError:  # Run as a script from machinelearning/
+    from feature_store import FeatureStore, FEATURES
+    from model_registry import ModelRegistry
+
+# Database, dataset, feature and model paths
 DATABASE_PATH = "activity_log.db"
-MODEL_PATH = "saved_models/activity_model.pkl"
+DATASET_PATH = "activity_dataset"
+FEATURE_STORE_PATH = "feature_store"
+REGISTRY_PATH = "saved_models/registry"
 
 # Step 1: Load and Prepare Data
-def load_and_prepare_data():
-    """Load data from the database and prepare features."""
-    # Connect to SQLite database
-    conn = sqlite3.connect(DATABASE_PATH)
-    df = pd.read_sql_query("SELECT * FROM playback_activity", conn)
-    conn.close()
-
-    # Parse timestamps and extract features
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['hour'] = df['timestamp'].dt.hour  # Hour of the day
-    df['day_of_week'] = df['timestamp'].dt.dayofweek  # Day of the week
-    df['is_weekend'] = df['day_of_week'].apply(lambda x: 1 if x >= 5 else 0)  # Weekend flag
-
-    # Encode 'status' as the target variable
+def encode_status(status):
+    """Encode the categorical 'status' column as the target, through the category codes rather than per row."""
+    status = status.cat.remove_unused_categories()
     label_encoder = LabelEncoder()
-    df['status_encoded'] = label_encoder.fit_transform(df['status'])
+    label_encoder.fit(status.cat.categories)
+    encoded = label_encoder.transform(status.cat.categories)
+    return pd.Series(encoded[status.cat.codes], index=status.index, name='status_encoded'), label_encoder
+
+def load_and_prepare_data(store=None):
+    """Load data from the database and prepare features."""
+    # Export and featurize only rows added since the last run (including, the first
+    # time, samples already downsampled to hourly counts), then map the cached columns
+    store = store or FeatureStore(FEATURE_STORE_PATH, DATABASE_PATH, DATASET_PATH)
+    store.update()
+    df = store.load()
 
     # Define features and target
-    X = df[['hour', 'day_of_week', 'is_weekend']]
-    y = df['status_encoded']
+    X = df[FEATURES]
+    y, label_encoder = encode_status(df['status'])
 
     # Split into training and test sets
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -38,11 +44,11 @@ def load_and_prepare_data():
     return X_train, X_test, y_train, y_test, label_encoder
 
 # Step 2: Train and Evaluate the Model
-def train_and_evaluate_model(X_train, X_test, y_train, y_test):
+def train_and_evaluate_model(X_train, X_test, y_train, y_test, callbacks=None):
     """Train a LightGBM model and evaluate its performance."""
     print("Training the model...")
     model = lgb.LGBMClassifier(random_state=42)
-    model.fit(X_train, y_train)
+    model.fit(X_train, y_train, callbacks=callbacks)
 
     # Make predictions
     y_pred = model.predict(X_test)
@@ -53,16 +59,33 @@ def train_and_evaluate_model(X_train, X_test, y_train, y_test):
 
     return model
 
+def evaluate_model(model, X_test, y_test):
+    """Accuracy and macro-averaged precision, recall and F1 on the test set, as a dict."""
+    if isinstance(model, lgb.Booster):  # Raw boosters return class probabilities
+        probabilities = model.predict(X_test)
+        y_pred = probabilities.argmax(axis=1) if probabilities.ndim > 1 else (probabilities > 0.5).astype(int)
+    else:
+        y_pred = model.predict(X_test)
+    report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+    return {
+        "accuracy": report["accuracy"],
+        "precision": report["macro avg"]["precision"],
+        "recall": report["macro avg"]["recall"],
+        "f1": report["macro avg"]["f1-score"],
+        "test_rows": len(X_test),
+    }
+
 # Step 3: Save the Model
-def save_model(model, label_encoder, model_path=MODEL_PATH):
-    """Save the trained model and label encoder to a file."""
-    joblib.dump((model, label_encoder), model_path)
-    print(f"Model and label encoder saved to {model_path}.")
+def save_model(model, label_encoder, metadata=None, registry_path=REGISTRY_PATH):
+    """Register the trained model and label encoder as a new active version."""
+    version = ModelRegistry(registry_path).save(model, label_encoder, metadata)
+    print(f"Model and label encoder saved as version {version} in {registry_path}.")
+    return version
 
 # Step 4: Load the Model (if needed later)
-def load_model(model_path=MODEL_PATH):
-    """Load a trained model and label encoder."""
-    return joblib.load(model_path)
+def load_model(registry_path=REGISTRY_PATH):
+    """Load the active model version (predicts status names directly)."""
+    return ModelRegistry(registry_path).active()
 
 # Main Workflow
 def main():
@@ -73,9 +96,12 @@ def main():
     # Train and evaluate the model
     model = train_and_evaluate_model(X_train, X_test, y_train, y_test)
 
-    # Save the model
+    # Save the model with its evaluation
     print("Saving the trained model...")
-    save_model(model, label_encoder)
+    metadata = evaluate_model(model, X_test, y_test)
+    metadata["training_rows"] = len(X_train)
+    metadata["feature_rows"] = len(X_train) + len(X_test)  # Feature store rows covered, for incremental updates
+    save_model(model, label_encoder, metadata)
 
 if __name__ == "__main__":
     main()
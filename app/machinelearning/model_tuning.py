@@ -0,0 +1,229 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np # type: ignore
+import lightgbm as lgb # type: ignore
+from sklearn.model_selection import TimeSeriesSplit # type: ignore
+
+try:
+    from .feature_store import FeatureStore, FEATURES
+    from .model_registry import ModelRegistry
+    from .model_training import encode_status, DATABASE_PATH, DATASET_PATH, FEATURE_STORE_PATH, REGISTRY_PATH
+except ImportError:  # Run as a script from machinelearning/
+    from feature_store import FeatureStore, FEATURES
+    from model_registry import ModelRegistry
+    from model_training import encode_status, DATABASE_PATH, DATASET_PATH, FEATURE_STORE_PATH, REGISTRY_PATH
+
+# Random search over LightGBM parameters for the activity model. Trials run in
+# a process pool capped at a CPU budget (one LightGBM thread per worker, at
+# lowered priority) so tuning can share the machine with the monitor. Each
+# trial is scored on expanding-window time-series splits, so validation rows
+# always come after the rows trained on, with early stopping per split. A trial
+# whose loss on a split is worse than the median of earlier trials on that
+# split is pruned. A trial that raises is recorded as failed and the search
+# goes on. Every trial is appended to a JSON-lines file and the best
+# parameters are refitted and registered.
+# Run from machinelearning/: python model_tuning.py --trials 40 --cpus 2
+TRIALS_PATH = "saved_models/tuning_trials.jsonl"
+
+_rows = {}  # Worker state: the feature rows, loaded once per process
+
+
+def sample_params(rng):
+    """Draw one set of LGBMClassifier parameters."""
+    return {
+        "num_leaves": int(np.exp(rng.uniform(np.log(8), np.log(256)))),
+        "learning_rate": float(np.exp(rng.uniform(np.log(0.01), np.log(0.3)))),
+        "min_child_samples": int(rng.integers(10, 300)),
+        "max_depth": int(rng.choice([-1, 4, 6, 8, 12])),
+        "subsample": float(rng.uniform(0.5, 1.0)),
+        "subsample_freq": 1,
+        "reg_lambda": float(np.exp(rng.uniform(np.log(1e-3), np.log(10)))),
+    }
+
+
+def _load_rows(store_path, start):
+    """Feature rows from `start` on, with encoded targets."""
+    df = FeatureStore(store_path).load(start=start)
+    y, label_encoder = encode_status(df["status"])
+    return df[FEATURES], y.to_numpy(), label_encoder
+
+
+def _init_worker(store_path, start, nice):
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+    _rows["X"], _rows["y"], _rows["label_encoder"] = _load_rows(store_path, start)
+
+
+def run_trial(number, params, thresholds, n_splits=3, max_rounds=1000, early_stopping_rounds=50, seed=0):
+    """
+    Score one parameter set on time-series splits, in a worker process.
+
+    Args:
+        number (int): Trial number.
+        params (dict): LGBMClassifier parameters to try.
+        thresholds (list): Per-split median loss of earlier trials (None where too few);
+            the trial is pruned once it does worse than one of them.
+        n_splits (int): Expanding-window splits.
+        max_rounds (int): Boosting rounds before early stopping.
+        early_stopping_rounds (int): Rounds without improvement that end a split.
+        seed (int): LightGBM seed.
+
+    Returns:
+        dict: Trial record with per-split losses, accuracies and best rounds.
+    """
+    start = time.perf_counter()
+    X, y = _rows["X"], _rows["y"]
+    num_class = len(_rows["label_encoder"].classes_)
+    train_params = dict(params, objective="multiclass", num_class=num_class, metric="multi_logloss",
+                        num_threads=1, seed=seed, verbosity=-1)
+    record = {"number": number, "params": params, "losses": [], "accuracies": [], "rounds": [], "state": "complete"}
+    for split, (train_index, valid_index) in enumerate(TimeSeriesSplit(n_splits=n_splits).split(X)):
+        train_set = lgb.Dataset(X.iloc[train_index], label=y[train_index])
+        valid_set = lgb.Dataset(X.iloc[valid_index], label=y[valid_index], reference=train_set)
+        booster = lgb.train(train_params, train_set, num_boost_round=max_rounds, valid_sets=[valid_set],
+                            callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)])
+        predictions = booster.predict(X.iloc[valid_index], num_iteration=booster.best_iteration).argmax(axis=1)
+        record["losses"].append(booster.best_score["valid_0"]["multi_logloss"])
+        record["accuracies"].append(float((predictions == y[valid_index]).mean()))
+        record["rounds"].append(booster.best_iteration)
+        threshold = thresholds[split] if split < len(thresholds) else None
+        if split < n_splits - 1 and threshold is not None and record["losses"][-1] > threshold:
+            record["state"] = "pruned"
+            break
+    record["loss"] = float(np.mean(record["losses"]))
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def _thresholds(records, n_splits, min_trials):
+    """Median loss per split over the trials that reached it, once `min_trials` have."""
+    thresholds = []
+    for split in range(n_splits):
+        losses = [record["losses"][split] for record in records if len(record["losses"]) > split]
+        thresholds.append(float(np.median(losses)) if len(losses) >= min_trials else None)
+    return thresholds
+
+
+def tune(store, registry, trials=30, cpus=None, n_splits=3, max_rows=1_000_000, seed=0,
+         trials_path=TRIALS_PATH, min_trials_before_pruning=5, nice=10, register=True):
+    """
+    Search LightGBM parameters and register a model refitted with the best ones.
+
+    Args:
+        store (FeatureStore): Feature store to train on (updated first).
+        registry (ModelRegistry): Receives the tuned model.
+        trials (int): Parameter sets to try.
+        cpus (int): Most cores used at once; defaults to half of them.
+        n_splits (int): Time-series splits per trial.
+        max_rows (int): Tune on only the newest rows, to bound trial time (None for all).
+        seed (int): Seed for the parameter draws and LightGBM.
+        trials_path (str): JSON-lines file the trial records are appended to.
+        min_trials_before_pruning (int): Trials needed on a split before pruning against it.
+        nice (int): Priority decrease for the worker processes.
+        register (bool): Refit and register the best parameters.
+
+    Returns:
+        dict: The best trial record, plus "version" if a model was registered.
+
+    Raises:
+        ValueError: `trials` is less than 1.
+        RuntimeError: No trial completed (all of them failed or were pruned).
+    """
+    if trials < 1:
+        raise ValueError(f"Tuning needs at least one trial, got {trials}")
+    store.update()
+    rows = store.state()["rows"]
+    start = max(rows - max_rows, 0) if max_rows else 0
+    cpus = max(1, min(cpus or (os.cpu_count() or 2) // 2, trials))
+    rng = np.random.default_rng(seed)
+    run = time.strftime("%Y%m%dT%H%M%S")
+    os.makedirs(os.path.dirname(trials_path) or ".", exist_ok=True)
+
+    records = []
+    pending = {}
+    submitted = 0
+    # Spawned workers, like the GUI's training job: forking a process with threads running isn't safe
+    with ProcessPoolExecutor(max_workers=cpus, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(store.path, start, nice)) as pool, \
+            open(trials_path, "a") as log:
+        while submitted < trials or pending:
+            # Keep only `cpus` trials in flight so each one is pruned against fresh medians
+            while submitted < trials and len(pending) < cpus:
+                thresholds = _thresholds(records, n_splits, min_trials_before_pruning)
+                params = sample_params(rng)
+                try:
+                    future = pool.submit(run_trial, submitted, params, thresholds, n_splits, seed=seed)
+                except BrokenProcessPool:
+                    print(f"Worker pool broke; stopping after {submitted} of {trials} trials.")
+                    trials = submitted
+                    break
+                pending[future] = (submitted, params)
+                submitted += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, params = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # One bad parameter set (or a crashed worker) shouldn't cost the trials already done
+                    record = {"number": number, "params": params, "losses": [], "accuracies": [], "rounds": [],
+                              "state": "failed", "error": repr(e)}
+                record.update({"run": run, "rows": rows - start})
+                records.append(record)
+                log.write(json.dumps(record) + "\n")
+                log.flush()
+                if record["state"] == "failed":
+                    print(f"Trial {number}: failed ({record['error']})")
+                else:
+                    print(f"Trial {record['number']}: {record['state']}, loss {record['loss']:.4f} "
+                          f"after {len(record['losses'])} splits ({record['seconds']:.1f}s)")
+
+    complete = [record for record in records if record["state"] == "complete"]
+    if not complete:
+        failed = sum(record["state"] == "failed" for record in records)
+        raise RuntimeError(f"No tuning trial completed ({failed} of {len(records)} failed); see {trials_path}")
+    best = min(complete, key=lambda record: record["loss"])
+    if register:
+        X, y, label_encoder = _load_rows(store.path, start)
+        model = lgb.LGBMClassifier(**best["params"], n_estimators=max(int(np.mean(best["rounds"])), 1),
+                                   random_state=seed, n_jobs=cpus, verbose=-1)
+        model.fit(X, y)
+        best["version"] = registry.save(model, label_encoder, {
+            "accuracy": float(np.mean(best["accuracies"])),
+            "cv_loss": best["loss"],
+            "training_rows": len(X),
+            "feature_rows": rows,
+            "mode": "full",
+            "reason": f"tuning run {run}, trial {best['number']} of {len(records)}",
+            "incremental_updates": 0,
+        })
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the activity model's LightGBM parameters.")
+    parser.add_argument("--trials", type=int, default=30)
+    parser.add_argument("--cpus", type=int, help="Most cores to use; defaults to half of them.")
+    parser.add_argument("--splits", type=int, default=3)
+    parser.add_argument("--max-rows", type=int, default=1_000_000, help="Tune on the newest rows only (0 for all).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-register", action="store_true")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+
+    best = tune(FeatureStore(FEATURE_STORE_PATH, DATABASE_PATH, DATASET_PATH), ModelRegistry(REGISTRY_PATH),
+                args.trials, args.cpus, args.splits, args.max_rows or None, args.seed, register=not args.no_register)
+    print(f"Best trial {best['number']}: loss {best['loss']:.4f}, accuracy {np.mean(best['accuracies']):.3f}, "
+          f"params {best['params']}" + (f"; registered as version {best['version']}" if "version" in best else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import httpx # type: ignore
+from activity_db import ActivityWriter, register_accounts
+from activity_monitor import parse_playback
+from poll_schedule import AdaptivePollSchedule
+
+# Polls many Spotify accounts from one process and logs them into one database.
+# Run from machinelearning/: python multi_account_monitor.py accounts.json
+#
+# accounts.json is a list of {"name", "access_token", "refresh_token", "expires_at"}.
+# Expired tokens are refreshed with SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET, and
+# the refreshed tokens are written back to the file on exit.
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+
+
+class Account:
+    """Token and poll schedule for one monitored account."""
+
+    __slots__ = ("name", "account_id", "access_token", "refresh_token", "expires_at", "schedule")
+
+    def __init__(self, name, access_token=None, refresh_token=None, expires_at=0, account_id=None, schedule=None):
+        self.name = name
+        self.account_id = account_id
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at or 0
+        self.schedule = schedule
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.expires_at,
+        }
+
+
+class MultiAccountMonitor:
+    def __init__(self, accounts, db_path="activity_log.db", check_interval=600, idle_interval=30,
+                 max_connections=50, flush_interval=5, client_id=None, client_secret=None,
+                 api_url=SPOTIFY_API_URL, accounts_url=SPOTIFY_ACCOUNTS_URL):
+        """
+        Monitor playback activity of many accounts on one asyncio event loop.
+
+        Each account has its own token and adaptive poll schedule. A due
+        account is handed to one of `max_connections` workers that share a
+        single keep-alive connection pool, so memory and open sockets stay
+        bounded however many accounts are monitored. A 429 pauses every
+        worker, since Spotify's rate limit is per app, not per account.
+
+        Args:
+            accounts (list): Account objects to monitor.
+            db_path (str): Path to the SQLite database file.
+            check_interval (float): Longest gap between polls of one account, in seconds.
+            idle_interval (float): First delay after an account stops playing, in seconds.
+            max_connections (int): Concurrent requests (and pooled connections) to Spotify.
+            flush_interval (float): Seconds between batched commits to the database.
+            client_id (str): Spotify app client ID, for refreshing expired tokens.
+            client_secret (str): Spotify app client secret.
+            api_url (str): Base URL of the Web API.
+            accounts_url (str): Base URL of the accounts service.
+        """
+        self.accounts = accounts
+        self.db_path = db_path
+        self.check_interval = check_interval
+        self.idle_interval = idle_interval
+        self.max_connections = max_connections
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url
+        self.accounts_url = accounts_url
+        self.writer = ActivityWriter(db_path, flush_interval=flush_interval)
+        self.stats = {"polls": 0, "errors": 0, "rate_limited": 0, "token_refreshes": 0}
+        self._resume_at = 0  # Loop time before which nobody polls (after a 429)
+
+    async def run(self, duration=None):
+        """Poll every account until cancelled, or for `duration` seconds."""
+        ids = register_accounts(self.db_path, [account.name for account in self.accounts])
+        for account in self.accounts:
+            account.account_id = ids[account.name]
+            account.schedule = account.schedule or AdaptivePollSchedule(
+                max_interval=self.check_interval, idle_interval=self.idle_interval
+            )
+        self.writer.start()
+
+        loop = asyncio.get_running_loop()
+        due = asyncio.Queue()
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        async with httpx.AsyncClient(limits=limits, timeout=10) as client:
+            # Spread the first polls out instead of starting every account at once
+            spread = min(len(self.accounts) / 50, self.idle_interval)
+            for account in self.accounts:
+                loop.call_later(random.uniform(0, spread), due.put_nowait, account)
+
+            workers = [asyncio.create_task(self._worker(client, due)) for _ in range(self.max_connections)]
+            try:
+                if duration is None:
+                    await asyncio.gather(*workers)
+                else:
+                    await asyncio.sleep(duration)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                await asyncio.to_thread(self.writer.close)
+
+    async def _worker(self, client, due):
+        loop = asyncio.get_running_loop()
+        while True:
+            account = await due.get()
+            wait = self._resume_at - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            delay = await self._poll(client, account)
+            loop.call_later(delay, due.put_nowait, account)
+
+    async def _poll(self, client, account):
+        """Poll one account, log the sample and return the delay until its next poll."""
+        self.stats["polls"] += 1
+        playback = None
+        try:
+            if account.expires_at and account.expires_at - time.time() < 60:
+                await self._refresh(client, account)
+            response = await self._get_player(client, account)
+            if response.status_code == 401 and account.refresh_token:
+                await self._refresh(client, account)
+                response = await self._get_player(client, account)
+
+            if response.status_code == 429:
+                retry_after = int(response.headers.get("Retry-After", self.idle_interval))
+                self.stats["rate_limited"] += 1
+                self._resume_at = max(self._resume_at, asyncio.get_running_loop().time() + retry_after)
+                return retry_after + account.schedule.next_delay(None)
+            response.raise_for_status()
+
+            if response.status_code != 204:
+                playback = parse_playback(response.json())
+            if playback:
+                status = "playing" if playback["is_playing"] else "paused"
+                self.writer.write(status, playback["item"], playback["progress_ms"], playback["device"],
+                                  account_id=account.account_id)
+            else:
+                self.writer.write("no_playback", account_id=account.account_id)
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self.stats["errors"] += 1
+            print(f"Error monitoring {account.name}: {e}")
+        return account.schedule.next_delay(playback)
+
+    def _get_player(self, client, account):
+        return client.get(f"{self.api_url}/me/player", headers={"Authorization": f"Bearer {account.access_token}"})
+
+    async def _refresh(self, client, account):
+        """Swap the account's refresh token for a new access token."""
+        if not (account.refresh_token and self.client_id and self.client_secret):
+            return
+        response = await client.post(
+            f"{self.accounts_url}/api/token",
+            data={"grant_type": "refresh_token", "refresh_token": account.refresh_token},
+            auth=(self.client_id, self.client_secret),
+        )
+        response.raise_for_status()
+        tokens = response.json()
+        account.access_token = tokens["access_token"]
+        account.refresh_token = tokens.get("refresh_token") or account.refresh_token
+        account.expires_at = time.time() + tokens.get("expires_in", 3600)
+        self.stats["token_refreshes"] += 1
+
+
+def load_accounts(path):
+    with open(path, "r") as f:
+        return [Account(**entry) for entry in json.load(f)]
+
+
+def save_accounts(path, accounts):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump([account.to_dict() for account in accounts], f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor playback activity of many Spotify accounts.")
+    parser.add_argument("accounts_path", help="JSON list of accounts and their tokens.")
+    parser.add_argument("--db-path", default="activity_log.db")
+    parser.add_argument("--check-interval", type=float, default=600)
+    parser.add_argument("--max-connections", type=int, default=50)
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds.")
+    args = parser.parse_args()
+
+    accounts = load_accounts(args.accounts_path)
+    monitor = MultiAccountMonitor(
+        accounts,
+        db_path=args.db_path,
+        check_interval=args.check_interval,
+        max_connections=args.max_connections,
+        client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+        client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
+    )
+    print(f"Monitoring {len(accounts)} accounts.")
+    try:
+        asyncio.run(monitor.run(args.duration))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        save_accounts(args.accounts_path, accounts)
+        print(f"Activity monitor stopped: {monitor.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import random
+
+
+class AdaptivePollSchedule:
+    def __init__(self, max_interval=600, min_interval=5, idle_interval=30, track_end_margin=2, jitter=2, seed=None):
+        """
+        Decide when to poll Spotify next from what the last poll returned.
+
+        While a track is playing, the next poll lands just after it ends, so
+        every track transition is sampled with one call per track. While
+        paused or idle, the delay starts at `idle_interval` and doubles up to
+        `max_interval`, resetting as soon as something plays again.
+
+        Args:
+            max_interval (float): Longest delay between polls, in seconds.
+            min_interval (float): Shortest delay between polls, in seconds.
+            idle_interval (float): First delay after playback stops, in seconds.
+            track_end_margin (float): Seconds to wait past the expected end of a track.
+            jitter (float): Random extra delay, uniform 0..jitter seconds, so many monitors don't poll in lockstep.
+            seed (int): Seed for the jitter, for reproducible simulations.
+        """
+        self.max_interval = max_interval
+        self.min_interval = min_interval
+        self.idle_interval = idle_interval
+        self.track_end_margin = track_end_margin
+        self.jitter = jitter
+        self._idle_delay = None
+        self._random = random.Random(seed)
+
+    def next_delay(self, playback):
+        """
+        Return the seconds to wait before the next poll.
+
+        Args:
+            playback (dict): Last playback status (with `is_playing`, `progress_ms`
+                and `duration_ms`), or None when nothing was playing or the poll failed.
+        """
+        jitter = self._random.uniform(0, self.jitter)
+        if playback and playback.get("is_playing") and playback.get("duration_ms"):
+            self._idle_delay = None
+            remaining = max(playback["duration_ms"] - (playback.get("progress_ms") or 0), 0) / 1000
+            delay = remaining + self.track_end_margin + jitter
+        else:
+            if self._idle_delay is None:
+                self._idle_delay = self.idle_interval
+            else:
+                self._idle_delay = min(self._idle_delay * 2, self.max_interval)
+            delay = self._idle_delay + jitter
+        return min(max(delay, self.min_interval), self.max_interval)
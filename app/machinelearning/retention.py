@@ -0,0 +1,129 @@
+import argparse
+import time
+
+try:
+    from .activity_db import connect, upgrade
+    from .activity_export import export_activity, read_watermark, DATASET_PATH
+except ImportError:  # Run as a script from machinelearning/
+    from activity_db import connect, upgrade
+    from activity_export import export_activity, read_watermark, DATASET_PATH
+
+# Keeps activity_log.db bounded: raw samples older than the retention age are
+# folded into activity_hourly buckets and deleted, a chunk per transaction, and
+# the freed pages are returned to the filesystem with incremental vacuum.
+# The listening rollups are maintained as samples arrive and never read the
+# raw rows, so they stay exact.
+# New rows are exported to the Parquet training dataset first, and only rows
+# the dataset already holds are downsampled, so the trainer keeps every raw
+# sample. (Buckets from before the first export reach it through the feature
+# store's hourly backlog instead.)
+# Run from machinelearning/: python retention.py --max-age-days 30
+DATABASE_PATH = "activity_log.db"
+
+
+def _chunk_bound(conn, cutoff, max_id, chunk_size):
+    """Timestamp below which the next chunk's rows lie (at most `cutoff`)."""
+    row = conn.execute("""
+        SELECT timestamp FROM playback_activity WHERE timestamp < ? AND id <= ?
+        ORDER BY timestamp LIMIT 1 OFFSET ?
+    """, (cutoff, max_id, chunk_size)).fetchone()
+    return row[0] + 1 if row else cutoff
+
+
+def downsample_chunk(conn, cutoff, chunk_size=5000, max_id=2**63 - 1):
+    """
+    Move the oldest raw samples before `cutoff` into hourly buckets, in one short transaction.
+
+    Only rows with an id up to `max_id` (the export watermark) are touched.
+
+    Returns:
+        int: Raw rows removed (0 once nothing older than the cutoff is left).
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        bound = _chunk_bound(conn, cutoff, max_id, chunk_size)
+        conn.execute("""
+            INSERT INTO activity_hourly (account_id, hour, status, track_id, samples)
+            SELECT account_id, timestamp - timestamp % 3600, status, COALESCE(track_id, 0), COUNT(*)
+            FROM playback_activity
+            WHERE timestamp < ? AND id <= ?
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT DO UPDATE SET samples = samples + excluded.samples
+        """, (bound, max_id))
+        return conn.execute("DELETE FROM playback_activity WHERE timestamp < ? AND id <= ?", (bound, max_id)).rowcount
+
+
+def incremental_vacuum(conn, pages=2000, pause=0.05):
+    """Release free pages `pages` at a time until none are left; returns the number released."""
+    released = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return released
+        # executescript steps the pragma to completion; execute() would free a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({min(free, pages)});")
+        released += min(free, pages)
+        time.sleep(pause)
+
+
+def apply_retention(db_path=DATABASE_PATH, max_age_days=90, chunk_size=5000, pause=0.05, now=None,
+                    dataset_path=DATASET_PATH):
+    """
+    Downsample and delete raw samples older than `max_age_days`, then compact the file.
+
+    Each chunk is its own transaction followed by a short pause, so the
+    monitor's writer only ever waits for one chunk.
+
+    Args:
+        db_path (str): Path to the SQLite database file.
+        max_age_days (float): Raw samples older than this are downsampled.
+        chunk_size (int): Raw rows removed per transaction.
+        pause (float): Seconds to sleep between chunks.
+        now (float): Unix time the age is measured from; defaults to now.
+        dataset_path (str): Parquet training dataset to export to first; rows not
+            exported yet are kept. None downsamples without exporting.
+
+    Returns:
+        dict: Rows downsampled, pages released and elapsed seconds.
+    """
+    upgrade(db_path)
+    cutoff = int((now or time.time()) - max_age_days * 86400)
+    start = time.perf_counter()
+    max_id = 2**63 - 1
+    if dataset_path is not None:
+        export_activity(db_path, dataset_path)
+        max_id = read_watermark(dataset_path)["last_id"]
+    conn = connect(db_path)
+    try:
+        removed = 0
+        while True:
+            deleted = downsample_chunk(conn, cutoff, chunk_size, max_id)
+            if not deleted:
+                break
+            removed += deleted
+            time.sleep(pause)
+        released = incremental_vacuum(conn, pause=pause)
+        # Fold the WAL back in so it doesn't hold on to the deleted pages
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    finally:
+        conn.close()
+    return {"downsampled_rows": removed, "released_pages": released, "seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsample old activity samples and compact the database.")
+    parser.add_argument("--db-path", default=DATABASE_PATH)
+    parser.add_argument("--max-age-days", type=float, default=90)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--dataset-path", default=DATASET_PATH, help="Training dataset to export to first.")
+    parser.add_argument("--no-export", action="store_true", help="Downsample without exporting to the dataset.")
+    args = parser.parse_args()
+
+    result = apply_retention(args.db_path, args.max_age_days, args.chunk_size,
+                             dataset_path=None if args.no_export else args.dataset_path)
+    print(f"Downsampled {result['downsampled_rows']} rows and released {result['released_pages']} pages "
+          f"in {result['seconds']:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,14 @@
-import joblib # type: ignore
 import pandas as pd # type: ignore
+from model_registry import ModelRegistry
 
-# Path to the saved model
-MODEL_PATH = "saved_models/activity_model.pkl"
+# Registry of saved models
+REGISTRY_PATH = "saved_models/registry"
 
 def test_model():
     """Test the trained model with sample data."""
-    # Load the trained model and label encoder
-    model, label_encoder = joblib.load(MODEL_PATH)
+    # Load the active model version
+    model = ModelRegistry(REGISTRY_PATH).active()
+    print(f"Using model version {model.version}")
 
     # Sample data for testing
     sample_data = pd.DataFrame({
@@ -17,8 +18,7 @@ def test_model():
     })
 
     # Make predictions
-    predictions = model.predict(sample_data)
-    decoded_predictions = label_encoder.inverse_transform(predictions)
+    decoded_predictions = model.predict(sample_data)
 
     # Display results
     for i, prediction in enumerate(decoded_predictions):
@@ -0,0 +1,71 @@
+import os
+import traceback
+from pathlib import Path
+
+try:
+    from .model_training import load_and_prepare_data, train_and_evaluate_model, evaluate_model
+except ImportError:  # Run as a script from machinelearning/
+    from model_training import load_and_prepare_data, train_and_evaluate_model, evaluate_model
+
+# Entry point for training in a child process, so LightGBM gets every core and
+# the GUI thread never waits on it. The job reports back through a
+# multiprocessing queue as (kind, payload) events:
+#   ("progress", (stage, fraction))   ("metrics", dict)
+#   ("finished", (model, label_encoder))   ("failed", message)   ("cancelled", None)
+# and stops at the next boosting round once `cancel_event` is set.
+
+
+class TrainingCancelled(Exception):
+    """Raised inside the training process once the job has been cancelled."""
+
+
+def _check_cancelled(cancel_event):
+    if cancel_event.is_set():
+        raise TrainingCancelled()
+
+
+def _boosting_callback(events, cancel_event):
+    """LightGBM callback that reports each round and aborts training when cancelled."""
+    def callback(env):
+        _check_cancelled(cancel_event)
+        rounds = env.end_iteration - env.begin_iteration
+        events.put(("progress", ("Training", (env.iteration - env.begin_iteration + 1) / rounds)))
+    callback.order = 100
+    return callback
+
+
+def run_training_job(events, cancel_event, workdir=None):
+    """
+    Load the data, train and evaluate the model, reporting through `events`.
+
+    Args:
+        events (multiprocessing.Queue): Receives the (kind, payload) events.
+        cancel_event (multiprocessing.Event): Set by the parent to stop the job.
+        workdir (str): Directory the data and model paths are relative to;
+            defaults to machinelearning/.
+    """
+    try:
+        # The child process has its own working directory, so this doesn't move the GUI's
+        os.chdir(workdir or Path(__file__).parent)
+
+        events.put(("progress", ("Loading data", 0.0)))
+        X_train, X_test, y_train, y_test, label_encoder = load_and_prepare_data()
+        _check_cancelled(cancel_event)
+
+        events.put(("progress", ("Training", 0.0)))
+        model = train_and_evaluate_model(
+            X_train, X_test, y_train, y_test, callbacks=[_boosting_callback(events, cancel_event)]
+        )
+        _check_cancelled(cancel_event)
+
+        events.put(("progress", ("Evaluating", 1.0)))
+        metrics = evaluate_model(model, X_test, y_test)
+        metrics["training_rows"] = len(X_train)
+        metrics["feature_rows"] = len(X_train) + len(X_test)
+        events.put(("metrics", metrics))
+        events.put(("finished", (model, label_encoder)))
+    except TrainingCancelled:
+        events.put(("cancelled", None))
+    except Exception as e:
+        traceback.print_exc()
+        events.put(("failed", str(e)))
@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import QMainWindow, QLabel, QPushButton, QVBoxLayout, QWidget, QTabWidget, QDateTimeEdit, QHBoxLayout, QListWidget, QLineEdit # type: ignore
+from PyQt5.QtWidgets import QMainWindow, QLabel, QPushButton, QVBoxLayout, QWidget, QTabWidget, QDateTimeEdit, QHBoxLayout, QListWidget, QLineEdit, QProgressBar # type: ignore
 from PyQt5.QtCore import QDateTime, Qt # type: ignore
 from PyQt5.QtGui import QIcon # type: ignore
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas # type: ignore
@@ -65,6 +65,15 @@ class MainWindow(QMainWindow):
         self.save_preferences_button = QPushButton("Save Preferences")
         self.preferences_layout.addWidget(self.save_preferences_button)
 
+        self.progress_label = QLabel("Wrapped Progress This Year:")
+        self.preferences_layout.addWidget(self.progress_label)
+
+        self.progress_list = QListWidget()
+        self.preferences_layout.addWidget(self.progress_list)
+
+        self.refresh_progress_button = QPushButton("Refresh Progress")
+        self.preferences_layout.addWidget(self.refresh_progress_button)
+
         self.preferences_tab.setLayout(self.preferences_layout)
         self.tabs.addTab(self.preferences_tab, "User Preferences")
 
@@ -101,6 +110,20 @@ class MainWindow(QMainWindow):
         self.start_training_button = QPushButton("Start Training")
         self.ml_layout.addWidget(self.start_training_button)
 
+        self.cancel_training_button = QPushButton("Cancel Training")
+        self.cancel_training_button.setEnabled(False)
+        self.ml_layout.addWidget(self.cancel_training_button)
+
+        self.training_status_label = QLabel("Training Status: Idle")
+        self.ml_layout.addWidget(self.training_status_label)
+
+        self.training_progress_bar = QProgressBar()
+        self.training_progress_bar.setRange(0, 100)
+        self.ml_layout.addWidget(self.training_progress_bar)
+
+        self.training_metrics_label = QLabel("")
+        self.ml_layout.addWidget(self.training_metrics_label)
+
         self.create_model_button = QPushButton("Create Model")
         self.ml_layout.addWidget(self.create_model_button)
 
@@ -2,7 +2,7 @@ import json
 from spotipy.oauth2 import SpotifyOAuth  # type: ignore
 import os
 
-with open("config.json", "r") as config_file:
+with open(os.getenv("SPOTIFY_CONFIG_PATH", "config.json"), "r") as config_file:
     config = json.load(config_file)
 
 SPOTIPY_CLIENT_ID = config["SPOTIFY_CLIENT_ID"]
@@ -18,14 +18,21 @@ SCOPES = (
     "streaming"
 )
 
+# Overridable so the backend can run against a local fake (see fake_spotify.py)
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL")
+
 def get_spotify_auth():
     """Returns a SpotifyOAuth object for handling authentication."""
-    return SpotifyOAuth(
+    sp_oauth = SpotifyOAuth(
         client_id=SPOTIPY_CLIENT_ID,
         client_secret=SPOTIPY_CLIENT_SECRET,
         redirect_uri=SPOTIPY_REDIRECT_URI,
         scope=SCOPES,
     )
+    if SPOTIFY_ACCOUNTS_URL:
+        sp_oauth.OAUTH_AUTHORIZE_URL = f"{SPOTIFY_ACCOUNTS_URL}/authorize"
+        sp_oauth.OAUTH_TOKEN_URL = f"{SPOTIFY_ACCOUNTS_URL}/api/token"
+    return sp_oauth
 
 def get_auth_url():
     """Generate and return the Spotify login URL."""
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+import uvicorn # type: ignore
+from spotipy import Spotify # type: ignore
+from spotify_client import SpotifyClient
+
+# Per-request latency of a new spotipy.Spotify() per call (the old behaviour)
+# versus the shared pooled SpotifyClient, both against fake_spotify.py.
+# Run from backend/: python bench_upstream.py --requests 500
+
+
+def start_fake_server(port):
+    """Run the fake Spotify API in a background thread and wait until it accepts requests."""
+    config = uvicorn.Config("fake_spotify:app", host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def summarize(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<28} mean {statistics.mean(samples) * 1000:7.2f} ms  "
+        f"p50 {statistics.median(samples) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+def bench_spotipy_per_request(base_url, requests):
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        sp = Spotify(auth="fake-token")
+        sp.prefix = base_url + "/"
+        sp.devices()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def bench_pooled_client(base_url, requests):
+    client = SpotifyClient(base_url=base_url)
+    samples = []
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.devices("fake-token")
+            samples.append(time.perf_counter() - start)
+    finally:
+        await client.aclose()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark upstream Spotify client reuse.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server, thread = start_fake_server(args.port)
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    try:
+        summarize("spotipy, new per request", bench_spotipy_per_request(base_url, args.requests))
+        summarize("pooled SpotifyClient", asyncio.run(bench_pooled_client(base_url, args.requests)))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+from fastapi import WebSocket # type: ignore
+from metrics import Counter, Gauge, Histogram
+
+# Event topics clients can subscribe to
+TOKEN_UPDATE = "token_update"
+PLAYER_STATE = "player_state"
+SCHEDULE_CHANGE = "schedule_change"
+TOPICS = (TOKEN_UPDATE, PLAYER_STATE, SCHEDULE_CHANGE)
+
+HEARTBEAT = "heartbeat"
+
+WEBSOCKET_CONNECTIONS = Gauge("websocket_connections", "Connected WebSocket clients.")
+WEBSOCKET_EVICTIONS = Counter("websocket_evictions_total", "WebSocket clients dropped for being slow or unreachable.")
+BROADCAST_LAG = Histogram("websocket_broadcast_lag_seconds", "Time from publishing an event to sending it to a client.")
+
+
+class Connection:
+    def __init__(self, websocket: WebSocket, max_queue, client_id=None):
+        self.websocket = websocket
+        self.client_id = client_id  # Sent by the desktop app so its own events can be skipped
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.topics = set(TOPICS)  # Subscribed to everything until told otherwise
+        self.writer_task = None
+
+
+class ConnectionManager:
+    def __init__(self, max_queue=100, send_timeout=5, heartbeat_interval=30):
+        """
+        Fan out events to WebSocket clients without letting one client stall the rest.
+
+        Every connection gets a bounded outbound queue drained by its own writer
+        task, so broadcasting only enqueues. A client whose queue fills up or
+        whose send times out is evicted.
+
+        Args:
+            max_queue (int): Maximum number of pending messages per connection.
+            send_timeout (int): Seconds a single send may take before the client is evicted.
+            heartbeat_interval (int): Seconds between heartbeat messages.
+        """
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.connections: dict[WebSocket, Connection] = {}
+        self._heartbeat_task = None
+
+    async def connect(self, websocket: WebSocket, client_id=None):
+        await websocket.accept()
+        connection = Connection(websocket, self.max_queue, client_id)
+        connection.writer_task = asyncio.create_task(self._writer(connection))
+        self.connections[websocket] = connection
+        WEBSOCKET_CONNECTIONS.set(len(self.connections))
+
+    async def disconnect(self, websocket: WebSocket):
+        connection = self.connections.pop(websocket, None)
+        WEBSOCKET_CONNECTIONS.set(len(self.connections))
+        if connection:
+            self._stop_writer(connection)
+
+    def _stop_writer(self, connection):
+        if connection.writer_task is not asyncio.current_task():
+            connection.writer_task.cancel()
+
+    def subscribe(self, websocket: WebSocket, topics):
+        """Replace the set of topics a connection receives."""
+        connection = self.connections.get(websocket)
+        if connection:
+            connection.topics = {topic for topic in topics if topic in TOPICS}
+
+    def publish(self, topic, data=None, exclude_client=None):
+        """Queue an event for every connection subscribed to `topic`, except those of `exclude_client`."""
+        message = json.dumps({"topic": topic, "data": data})
+        for connection in list(self.connections.values()):
+            if topic in connection.topics and (exclude_client is None or connection.client_id != exclude_client):
+                self._enqueue(connection, message)
+
+    def _enqueue(self, connection, message):
+        try:
+            connection.queue.put_nowait((message, time.perf_counter()))
+        except asyncio.QueueFull:
+            if self.connections.pop(connection.websocket, None) is not None:
+                print("WebSocket client is not keeping up. Evicting.")
+                asyncio.create_task(self._evict(connection))
+
+    async def _writer(self, connection):
+        """Drain one connection's queue; a failed or slow send evicts the client."""
+        while True:
+            message, enqueued_at = await connection.queue.get()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(message), timeout=self.send_timeout)
+                BROADCAST_LAG.observe(time.perf_counter() - enqueued_at)
+            except Exception as e:
+                print(f"WebSocket send failed: {e}. Evicting.")
+                await self._evict(connection)
+                return
+
+    async def _evict(self, connection):
+        WEBSOCKET_EVICTIONS.inc()
+        self.connections.pop(connection.websocket, None)
+        WEBSOCKET_CONNECTIONS.set(len(self.connections))
+        self._stop_writer(connection)
+        try:
+            await asyncio.wait_for(connection.websocket.close(code=1008), timeout=self.send_timeout)
+        except Exception:
+            pass  # Already gone
+
+    async def _heartbeat(self):
+        message = json.dumps({"topic": HEARTBEAT, "data": None})
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            for connection in list(self.connections.values()):
+                self._enqueue(connection, message)
+
+    def start(self):
+        """Start sending heartbeats on the running event loop."""
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def stop(self):
+        """Stop heartbeats and drop every connection."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        for websocket in list(self.connections):
+            await self.disconnect(websocket)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+
+class DeviceCache:
+    def __init__(self, ttl=30):
+        """
+        Short-lived cache of the user's Spotify devices.
+
+        Entries expire after `ttl` seconds and are dropped as soon as the Web
+        Playback SDK page reports a device coming online or going offline.
+        Concurrent misses share one upstream fetch. A fetch that started before
+        the last invalidation still answers its callers but isn't cached.
+
+        Args:
+            ttl (int): Seconds a device listing stays valid.
+        """
+        self.ttl = ttl
+        self.sdk_device_id = None  # Device registered by the /sdk-client page
+        self._devices = None
+        self._fetched_at = 0
+        self._inflight = None
+        self._generation = 0  # Bumped by every invalidation
+
+    def is_fresh(self):
+        return self._devices is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    async def get(self, fetch, fresh=False):
+        """
+        Return the cached device list, calling `fetch()` when it is missing or stale.
+
+        Args:
+            fetch (callable): Coroutine function returning the list of devices.
+            fresh (bool): Skip the cache and always fetch.
+        """
+        if not fresh and self.is_fresh():
+            return self._devices
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch(fetch))
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future):
+        if self._inflight is future:
+            self._inflight = None
+
+    async def _fetch(self, fetch):
+        generation = self._generation
+        devices = await fetch()
+        if generation == self._generation:  # Otherwise the listing may predate an SDK event
+            self._devices = devices
+            self._fetched_at = time.monotonic()
+        return devices
+
+    def invalidate(self):
+        self._devices = None
+        self._generation += 1
+        self._inflight = None  # Later callers start a fresh fetch instead of joining a stale one
+
+    def sdk_ready(self, device_id):
+        """The SDK player registered a device; it is the fallback playback target."""
+        self.sdk_device_id = device_id
+        self.invalidate()
+
+    def sdk_not_ready(self, device_id):
+        """The SDK player's device went offline."""
+        if self.sdk_device_id == device_id:
+            self.sdk_device_id = None
+        self.invalidate()
+
+    def mark_active(self, device_id):
+        """Record that playback was moved to `device_id` without refetching."""
+        for device in self._devices or []:
+            device["is_active"] = device["id"] == device_id
+
+    def choose_device(self, devices):
+        """Pick a playback target: the active device, else the SDK player, else the first one."""
+        for device in devices:
+            if device.get("is_active"):
+                return device["id"]
+        if self.sdk_device_id and any(device["id"] == self.sdk_device_id for device in devices):
+            return self.sdk_device_id
+        return devices[0]["id"] if devices else None
@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import os
+import random
+import time
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Request, Response, HTTPException # type: ignore
+from fastapi.responses import JSONResponse # type: ignore
+
+# Local stand-in for the Spotify Web API and accounts service, used by the
+# benchmarks and the load test. Run with: uvicorn fake_spotify:app --port 8765
+#
+# Point the backend at it with:
+#   SPOTIFY_API_URL=http://127.0.0.1:8765/v1
+#   SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8765
+#
+# Behaviour is configured through the environment:
+#   FAKE_SPOTIFY_LATENCY_MS     Added latency per request (default 0)
+#   FAKE_SPOTIFY_JITTER_MS      Random extra latency, uniform 0..N ms (default 0)
+#   FAKE_SPOTIFY_429_RATE       Fraction of API calls answered with 429 (default 0)
+#   FAKE_SPOTIFY_RETRY_AFTER    Retry-After seconds sent with a 429 (default 1)
+#   FAKE_SPOTIFY_TOKEN_TTL      Lifetime of issued access tokens in seconds (default 3600)
+#   FAKE_SPOTIFY_CHECK_TOKENS   Reject unknown or expired tokens with 401 (default 0)
+LATENCY_MS = int(os.getenv("FAKE_SPOTIFY_LATENCY_MS", "0"))
+JITTER_MS = int(os.getenv("FAKE_SPOTIFY_JITTER_MS", "0"))
+RATE_429 = float(os.getenv("FAKE_SPOTIFY_429_RATE", "0"))
+RETRY_AFTER = int(os.getenv("FAKE_SPOTIFY_RETRY_AFTER", "1"))
+TOKEN_TTL = int(os.getenv("FAKE_SPOTIFY_TOKEN_TTL", "3600"))
+CHECK_TOKENS = os.getenv("FAKE_SPOTIFY_CHECK_TOKENS", "0") == "1"
+
+app = FastAPI()
+
+DEVICES = [
+    {
+        "id": "fake-device-1",
+        "is_active": True,
+        "is_private_session": False,
+        "is_restricted": False,
+        "name": "Fake Desktop Player",
+        "type": "Computer",
+        "volume_percent": 80,
+    }
+]
+
+TRACKS = [
+    {
+        "id": f"faketrack{i}",
+        "uri": f"spotify:track:faketrack{i}",
+        "name": f"Song {i}",
+        "duration_ms": 180000 + i * 1000,
+        "artists": [{"id": f"fakeartist{i % 10}", "name": f"Artist {i % 10}"}],
+    }
+    for i in range(50)
+]
+
+PLAYER = {"is_playing": False, "track": 0, "started_at": time.time(), "queue": [], "shuffle": False, "repeat": "off"}
+
+token_counter = itertools.count(1)
+issued_tokens = {}  # access token -> expiry (epoch seconds)
+stats = {"requests": 0, "rate_limited": 0, "unauthorized": 0, "token_refreshes": 0}
+
+
+@app.middleware("http")
+async def simulate_upstream(request: Request, call_next):
+    """Apply latency, 429s and token checks to every Web API call."""
+    stats["requests"] += 1
+    delay = LATENCY_MS + (random.uniform(0, JITTER_MS) if JITTER_MS else 0)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+
+    if request.url.path.startswith("/v1/"):
+        if RATE_429 and random.random() < RATE_429:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status_code=429,
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+        if CHECK_TOKENS:
+            token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+            if issued_tokens.get(token, 0) < time.time():
+                stats["unauthorized"] += 1
+                return JSONResponse({"error": {"status": 401, "message": "The access token expired"}}, status_code=401)
+    return await call_next(request)
+
+
+@app.post("/api/token")
+async def token(request: Request):
+    """Issue a new access token for a refresh token or an authorization code."""
+    form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+    grant_type, refresh_token = form.get("grant_type"), form.get("refresh_token")
+    if grant_type not in ("refresh_token", "authorization_code"):
+        raise HTTPException(status_code=400, detail="unsupported_grant_type")
+    stats["token_refreshes"] += 1
+    access_token = f"fake-access-{next(token_counter)}"
+    issued_tokens[access_token] = time.time() + TOKEN_TTL
+    return {
+        "access_token": access_token,
+        "token_type": "Bearer",
+        "expires_in": TOKEN_TTL,
+        "refresh_token": refresh_token or "fake-refresh-token",
+        "scope": "user-read-playback-state user-modify-playback-state user-read-currently-playing user-read-private streaming",
+    }
+
+
+@app.get("/v1/me")
+async def me(request: Request):
+    # Spotify sends ETags on some resources; honour If-None-Match here so clients can test conditional GETs
+    etag = '"fakeuser-1"'
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(
+        {"id": "fakeuser", "display_name": "Fake User", "product": "premium", "type": "user"},
+        headers={"ETag": etag},
+    )
+
+
+@app.get("/v1/me/player/devices")
+async def devices():
+    return {"devices": DEVICES}
+
+
+def playback_state():
+    """Current playback; tracks play back to back from the last play call, so polls see real transitions."""
+    index, progress_ms = PLAYER["track"], int((time.time() - PLAYER["started_at"]) * 1000)
+    while progress_ms >= TRACKS[index % len(TRACKS)]["duration_ms"]:
+        progress_ms -= TRACKS[index % len(TRACKS)]["duration_ms"]
+        index += 1
+    return {
+        "is_playing": True,
+        "progress_ms": progress_ms,
+        "timestamp": int(time.time() * 1000),
+        "device": DEVICES[0],
+        "shuffle_state": PLAYER["shuffle"],
+        "repeat_state": PLAYER["repeat"],
+        "item": TRACKS[index % len(TRACKS)],
+    }
+
+
+@app.get("/v1/me/player")
+async def player():
+    if not PLAYER["is_playing"]:
+        return Response(status_code=204)
+    return playback_state()
+
+
+@app.get("/v1/me/player/currently-playing")
+async def currently_playing():
+    if not PLAYER["is_playing"]:
+        return Response(status_code=204)
+    state = playback_state()
+    del state["shuffle_state"], state["repeat_state"]
+    return state
+
+
+@app.put("/v1/me/player/play")
+async def play(request: Request):
+    body = await request.json() if await request.body() else {}
+    uris = body.get("uris") or []
+    if uris:
+        PLAYER["queue"] = list(uris)
+        PLAYER["track"] = (body.get("offset") or {}).get("position", 0)
+    PLAYER["is_playing"] = True
+    PLAYER["started_at"] = time.time() - (body.get("position_ms") or 0) / 1000
+    return Response(status_code=204)
+
+
+@app.put("/v1/me/player/pause")
+async def pause():
+    PLAYER["is_playing"] = False
+    return Response(status_code=204)
+
+
+@app.put("/v1/me/player/volume")
+async def volume(volume_percent: int):
+    DEVICES[0]["volume_percent"] = volume_percent
+    return Response(status_code=204)
+
+
+@app.post("/v1/me/player/queue")
+async def add_to_queue(uri: str):
+    PLAYER["queue"].append(uri)
+    return Response(status_code=204)
+
+
+@app.put("/v1/me/player/shuffle")
+async def shuffle(state: bool):
+    PLAYER["shuffle"] = state
+    return Response(status_code=204)
+
+
+@app.put("/v1/me/player/repeat")
+async def repeat(state: str):
+    PLAYER["repeat"] = state
+    return Response(status_code=204)
+
+
+@app.get("/v1/search")
+async def search(q: str, type: str = "track", limit: int = 1):
+    matches = [track for track in TRACKS if q.lower() in track["name"].lower()] or TRACKS
+    return {"tracks": {"items": matches[:limit]}}
+
+
+@app.get("/fake/stats")
+async def fake_stats():
+    """Counters the load test reads back after a run."""
+    return stats
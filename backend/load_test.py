@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+import httpx # type: ignore
+
+# Load test for the backend against fake_spotify.py, fully offline.
+# Starts the fake Spotify API and the backend as separate uvicorn processes,
+# drives the backend with N concurrent clients and reports throughput and
+# p50/p95/p99 latency per route.
+#
+# Run from anywhere: python backend/load_test.py --clients 50 --duration 20
+# Add --backend-url to drive an already running backend instead.
+
+BACKEND_DIR = Path(__file__).parent
+
+# (method, path, weight) -- roughly the mix the desktop app and SDK page generate
+ROUTES = [
+    ("GET", "/access_token", 4),
+    ("GET", "/devices", 3),
+    ("POST", "/play", 2),
+    ("POST", "/pause", 2),
+    ("POST", "/volume?volume_percent=50", 1),
+]
+
+
+def start_server(app, port, env, cwd):
+    """Start `app` under uvicorn in a child process."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", str(BACKEND_DIR),
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        cwd=cwd,
+    )
+
+
+def wait_until_up(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {url} did not start within {timeout} seconds.")
+
+
+async def client_worker(client, routes, weights, deadline, results, rng):
+    """One simulated client issuing requests back to back until the deadline."""
+    while time.monotonic() < deadline:
+        method, path, _ = rng.choices(routes, weights=weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = "error"
+        results[path].append((time.perf_counter() - start, status))
+
+
+async def run_load(base_url, clients, duration, seed):
+    results = defaultdict(list)
+    weights = [weight for _, _, weight in ROUTES]
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.monotonic() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            client_worker(client, ROUTES, weights, deadline, results, random.Random(seed + i))
+            for i in range(clients)
+        ])
+        elapsed = time.perf_counter() - started
+    return results, elapsed
+
+
+def percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * len(sorted_samples))) - 1)
+    return sorted_samples[max(index, 0)]
+
+
+def report(results, elapsed):
+    header = f"{'route':<28}{'requests':>9}{'req/s':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+    total = 0
+    for path in sorted(results):
+        samples = results[path]
+        latencies = sorted(latency for latency, _ in samples)
+        errors = sum(1 for _, status in samples if status == "error" or status >= 400)
+        total += len(samples)
+        print(
+            f"{path:<28}{len(samples):>9}{len(samples) / elapsed:>9.1f}{errors:>8}"
+            f"{percentile(latencies, 50) * 1000:>9.1f}{percentile(latencies, 95) * 1000:>9.1f}"
+            f"{percentile(latencies, 99) * 1000:>9.1f}"
+        )
+    print("-" * len(header))
+    all_latencies = sorted(latency for samples in results.values() for latency, _ in samples)
+    print(f"total {total} requests in {elapsed:.1f}s = {total / elapsed:.1f} req/s, "
+          f"mean {statistics.mean(all_latencies) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend against a local fake Spotify API.")
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent simulated clients.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to run the load.")
+    parser.add_argument("--latency-ms", type=int, default=50, help="Latency added by the fake Spotify API.")
+    parser.add_argument("--jitter-ms", type=int, default=20, help="Random extra fake latency.")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of fake API calls answered with 429.")
+    parser.add_argument("--token-ttl", type=int, default=3600, help="Lifetime of fake access tokens in seconds.")
+    parser.add_argument("--rate-limit", type=float, default=10, help="Backend SPOTIFY_RATE_LIMIT (requests/second).")
+    parser.add_argument("--fake-port", type=int, default=8765)
+    parser.add_argument("--backend-port", type=int, default=8766)
+    parser.add_argument("--backend-url", help="Drive this running backend instead of starting one.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="wrappedbooster-load-")
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    env = dict(
+        os.environ,
+        FAKE_SPOTIFY_LATENCY_MS=str(args.latency_ms),
+        FAKE_SPOTIFY_JITTER_MS=str(args.jitter_ms),
+        FAKE_SPOTIFY_429_RATE=str(args.rate_429),
+        FAKE_SPOTIFY_TOKEN_TTL=str(args.token_ttl),
+        FAKE_SPOTIFY_CHECK_TOKENS="1",
+        SPOTIFY_API_URL=f"{fake_url}/v1",
+        SPOTIFY_ACCOUNTS_URL=fake_url,
+        SPOTIFY_CONFIG_PATH=os.path.join(workdir, "config.json"),
+        TOKEN_FILE=os.path.join(workdir, ".user"),
+        SPOTIFY_RATE_LIMIT=str(args.rate_limit),
+        SPOTIFY_RATE_BURST=str(max(int(args.rate_limit * 2), 1)),
+    )
+    # Throwaway credentials so the real config.json and .user are never touched
+    with open(env["SPOTIFY_CONFIG_PATH"], "w") as f:
+        json.dump({
+            "SPOTIFY_CLIENT_ID": "fake-client-id",
+            "SPOTIFY_CLIENT_SECRET": "fake-client-secret",
+            "SPOTIFY_REDIRECT_URI": "http://127.0.0.1/callback",
+        }, f)
+    with open(env["TOKEN_FILE"], "w") as f:
+        f.write("REFRESH_TOKEN=fake-refresh-token\n")
+
+    processes = [start_server("fake_spotify:app", args.fake_port, env, workdir)]
+    try:
+        wait_until_up(f"{fake_url}/fake/stats")
+        backend_url = args.backend_url
+        if not backend_url:
+            backend_url = f"http://127.0.0.1:{args.backend_port}"
+            processes.append(start_server("server:app", args.backend_port, env, workdir))
+            wait_until_up(f"{backend_url}/")
+
+        print(f"{args.clients} clients for {args.duration}s against {backend_url} "
+              f"(fake latency {args.latency_ms}+{args.jitter_ms} ms, 429 rate {args.rate_429})")
+        results, elapsed = asyncio.run(run_load(backend_url, args.clients, args.duration, args.seed))
+        report(results, elapsed)
+        print("fake Spotify:", httpx.get(f"{fake_url}/fake/stats").json())
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import json
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+PREFERENCES_PATH = Path(__file__).parent.parent / "app" / "user_preferences.json"
+
+# Spotify accepts up to this many URIs in one start-playback call; the rest are queued
+PLAY_BATCH_LIMIT = 100
+
+TRACK_URL_PATTERN = re.compile(r"open\.spotify\.com/track/([A-Za-z0-9]+)")
+TRACK_URI_PATTERN = re.compile(r"^spotify:track:[A-Za-z0-9]+$")
+
+
+class ResolvedNames:
+    def __init__(self, max_size=1000, ttl=24 * 3600, miss_ttl=300):
+        """
+        Bounded LRU of song names resolved to track URIs by search.
+
+        Matches are kept for `ttl` seconds; names with no match only for
+        `miss_ttl`, so a song added to Spotify later is found without a restart.
+
+        Args:
+            max_size (int): Most names kept; the least recently used go first.
+            ttl (int): Seconds a match stays valid.
+            miss_ttl (int): Seconds a search with no match is remembered.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._entries = OrderedDict()  # name -> (uri or None, expires_at)
+
+    def get(self, name):
+        """Return (found, uri) for `name`; found is False when it must be searched."""
+        entry = self._entries.get(name)
+        if entry is None:
+            return False, None
+        uri, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[name]
+            return False, None
+        self._entries.move_to_end(name)
+        return True, uri
+
+    def put(self, name, uri):
+        self._entries[name] = (uri, time.monotonic() + (self.ttl if uri else self.miss_ttl))
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+# Song names from the preferences file resolved to URIs, so each is searched only once in a while
+_resolved_names = ResolvedNames()
+
+
+def load_preference_entries(path=PREFERENCES_PATH):
+    """Return the boost list saved by the desktop app."""
+    with open(path, "r") as f:
+        return json.load(f).get("songs", [])
+
+
+def normalize_uri(entry):
+    """Turn a track URI or open.spotify.com URL into a track URI; None for anything else."""
+    entry = entry.strip()
+    if TRACK_URI_PATTERN.match(entry):
+        return entry
+    match = TRACK_URL_PATTERN.search(entry)
+    if match:
+        return f"spotify:track:{match.group(1)}"
+    return None
+
+
+async def resolve_uris(client, access_token, entries):
+    """Map URIs, track URLs and plain song names to track URIs, skipping names with no match."""
+    uris = []
+    for entry in entries:
+        uri = normalize_uri(entry)
+        if uri is None:
+            found, uri = _resolved_names.get(entry)
+            if not found:
+                uri = await client.search_track(access_token, entry)
+                _resolved_names.put(entry, uri)
+        if uri:
+            uris.append(uri)
+        else:
+            print(f"No track found for '{entry}'. Skipping.")
+    return uris
+
+
+async def play_queue(client, access_token, uris, offset=0, position_ms=None, shuffle=None, repeat=None, device_id=None):
+    """
+    Start playback of a whole batch of tracks with as few upstream calls as possible.
+
+    The first PLAY_BATCH_LIMIT tracks go into a single start-playback call;
+    any beyond that are appended with add-to-queue.
+
+    Returns:
+        int: Number of upstream calls made.
+    """
+    if offset >= PLAY_BATCH_LIMIT:
+        # Resuming past the first batch: start the batch at the resume point instead
+        uris, offset = uris[offset:], 0
+    batch, rest = uris[:PLAY_BATCH_LIMIT], uris[PLAY_BATCH_LIMIT:]
+    await client.start_playback(access_token, uris=batch, offset=offset, position_ms=position_ms, device_id=device_id)
+    calls = 1
+
+    # Playback has started, so the device is active for the mode changes
+    if shuffle is not None:
+        await client.shuffle(access_token, shuffle, device_id=device_id)
+        calls += 1
+    if repeat is not None:
+        await client.repeat(access_token, repeat, device_id=device_id)
+        calls += 1
+
+    for uri in rest:
+        await client.add_to_queue(access_token, uri, device_id=device_id)
+        calls += 1
+    return calls
@@ -0,0 +1,85 @@
+import asyncio
+import heapq
+import itertools
+import time
+from metrics import Counter, Gauge
+
+# Priority classes, lower runs first
+INTERACTIVE = 0  # User-facing playback commands
+BACKGROUND = 1  # Device listing, polling and other traffic that can wait
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+SCHEDULER_WAITING = Gauge("spotify_scheduler_waiting", "Requests waiting for a rate-limit token.", ["priority"])
+SCHEDULER_THROTTLED = Counter("spotify_scheduler_throttled_total", "429 responses received from Spotify.")
+
+
+class RequestScheduler:
+    def __init__(self, rate=10, burst=20):
+        """
+        Token-bucket rate limiter shared by every Spotify API call.
+
+        Waiting requests are released in priority order, so interactive
+        playback commands overtake queued background traffic. A 429 with
+        Retry-After pauses the whole bucket until Spotify allows calls again.
+
+        Args:
+            rate (float): Sustained requests per second.
+            burst (int): Maximum number of requests allowed in a burst.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._dispatcher = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _delay(self):
+        """Seconds until the next request may be sent."""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    async def acquire(self, priority=BACKGROUND):
+        """Wait for permission to send one request."""
+        if not self._waiters and self._delay() == 0:
+            self._tokens -= 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        SCHEDULER_WAITING.inc(priority=PRIORITY_NAMES[priority])
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await future
+        finally:
+            SCHEDULER_WAITING.dec(priority=PRIORITY_NAMES[priority])
+
+    async def _dispatch(self):
+        while self._waiters:
+            delay = self._delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():  # Skip callers that gave up
+                self._tokens -= 1
+                future.set_result(None)
+
+    def retry_after(self, seconds):
+        """Hold every request for `seconds`, as asked by a 429 response."""
+        SCHEDULER_THROTTLED.inc()
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0
@@ -1,79 +1,125 @@
 import asyncio
-from asyncio import Lock
+import json
+from functools import partial
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect # type: ignore
-from fastapi.responses import RedirectResponse, HTMLResponse # type: ignore
-from spotipy import Spotify, SpotifyException # type: ignore
-from auth import get_auth_url, get_tokens, refresh_token
-from dotenv import load_dotenv
-from datetime import datetime, timedelta
+from fastapi.responses import HTMLResponse, PlainTextResponse # type: ignore
+from pydantic import BaseModel # type: ignore
+from typing import Optional
+from auth import get_auth_url, get_tokens
+from token_manager import TokenManager
+from connection_manager import ConnectionManager, TOKEN_UPDATE, PLAYER_STATE, SCHEDULE_CHANGE
+from spotify_client import SpotifyClient, SpotifyAPIError, UpstreamBusyError, UpstreamUnavailableError, SPOTIFY_API_URL
+from request_scheduler import RequestScheduler
+from playback_queue import load_preference_entries, resolve_uris, play_queue
+from device_cache import DeviceCache
+import metrics
+from metrics import Gauge, Histogram
+from anyio import to_thread
+import time
+from token_store import TokenStore
+from datetime import datetime
 import os
 from pathlib import Path
 from fastapi.staticfiles import StaticFiles
 
 
 
-dotenv_path = Path(__file__).parent.parent / ".user"  # Adjust for relative paths
-load_dotenv(dotenv_path)
+dotenv_path = Path(os.getenv("TOKEN_FILE", Path(__file__).parent.parent / ".user"))  # Adjust for relative paths
+token_store = TokenStore(dotenv_path)
+stored_tokens = token_store.load()
 
-ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
-REFRESH_TOKEN = os.getenv("REFRESH_TOKEN")
-EXPIRES_IN = os.getenv("EXPIRES_IN")
-TOKEN_EXPIRY_TIME = None  # Tracks token expiry time
-
-app = FastAPI()
-
-def update_env(tokens):
+manager = ConnectionManager()
+device_cache = DeviceCache(ttl=int(os.getenv("DEVICE_CACHE_TTL", "30")))
+
+def on_token_refresh(tokens):
+    token_store.update(tokens)  # Written to .user in the background
+    # Notify clients that a new token is available from /access_token
+    manager.publish(TOKEN_UPDATE, {"expires_at": token_store.get()["expires_at"]})
+
+# Without a stored expiry, the first use (or the background task) refreshes
+token_manager = TokenManager(
+    access_token=stored_tokens["access_token"],
+    refresh_token=stored_tokens["refresh_token"],
+    expiry_time=datetime.fromtimestamp(stored_tokens["expires_at"]) if stored_tokens["expires_at"] else None,
+    on_refresh=on_token_refresh,
+)
+
+@asynccontextmanager
+async def lifespan(app):
+    # One pooled upstream client for the lifetime of the app, shared by all playback routes
+    app.state.spotify = SpotifyClient(
+        base_url=os.getenv("SPOTIFY_API_URL", SPOTIFY_API_URL),
+        pool_size=int(os.getenv("SPOTIFY_POOL_SIZE", "20")),
+        max_concurrency=int(os.getenv("SPOTIFY_MAX_CONCURRENCY", "10")),
+        max_queue=int(os.getenv("SPOTIFY_MAX_QUEUE", "100")),
+        scheduler=RequestScheduler(
+            rate=float(os.getenv("SPOTIFY_RATE_LIMIT", "10")),
+            burst=int(os.getenv("SPOTIFY_RATE_BURST", "20")),
+        ),
+    )
+    token_manager.start()
+    manager.start()
+    yield
+    await manager.stop()
+    await token_manager.stop()
+    await token_store.flush()
+    await app.state.spotify.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+REQUEST_DURATION = Histogram("http_request_duration_seconds", "Backend request latency by route.", ["method", "route", "status"])
+THREADPOOL_IN_USE = Gauge("threadpool_workers_in_use", "Threadpool workers busy with sync routes.")
+THREADPOOL_SIZE = Gauge("threadpool_workers_total", "Threadpool size for sync routes.")
+THREADPOOL_WAITING = Gauge("threadpool_tasks_waiting", "Sync route calls waiting for a threadpool worker.")
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, so query strings and IDs don't explode the series
+    route = request.scope.get("route")
+    REQUEST_DURATION.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
+async def get_access_token():
+    """Return a valid access token, refreshing it once for all concurrent callers."""
     try:
-        with open(dotenv_path, "w") as f:
-            f.write(f"ACCESS_TOKEN={tokens['access_token']}\n")
-            f.write(f"REFRESH_TOKEN={tokens['refresh_token']}\n")
-            f.write(f"EXPIRES_IN={tokens['expires_in']}\n")
-        global ACCESS_TOKEN, REFRESH_TOKEN
-        ACCESS_TOKEN = tokens['access_token']
-        REFRESH_TOKEN = tokens['refresh_token']
-        set_token_expiry(tokens['expires_in'])
+        return await token_manager.get_token()
     except Exception as e:
-        print(f"Error updating tokens: {e}")
-
-def is_token_expired():
-    if TOKEN_EXPIRY_TIME is None:
-        return True
-    return datetime.now() >= TOKEN_EXPIRY_TIME
-
-def set_token_expiry(expires_in):
-    global TOKEN_EXPIRY_TIME
-    TOKEN_EXPIRY_TIME = datetime.now() + timedelta(seconds=int(expires_in))
-
-def refresh_access_token_if_needed():
-    global ACCESS_TOKEN, REFRESH_TOKEN
-    if is_token_expired():
-        print("Access token expired. Attempting to refresh...")
-        try:
-            tokens = refresh_token(REFRESH_TOKEN)
-            print("Refreshed Tokens:", tokens)
-            update_env(tokens)
-        except Exception as e:
-            print(f"Error refreshing token: {e}")
-            raise HTTPException(status_code=500, detail="Token refresh failed.")
+        print(f"Error refreshing token: {e}")
+        raise HTTPException(status_code=500, detail="Token refresh failed.")
 
-
-
-def get_spotify_client():
-    refresh_access_token_if_needed()
-    print(f"Using token: {ACCESS_TOKEN}")
-    return Spotify(auth=ACCESS_TOKEN)
+async def call_spotify(method, *args, **kwargs):
+    """Run a SpotifyClient call with a valid access token."""
+    access_token = await get_access_token()
+    try:
+        return await method(access_token, *args, **kwargs)
+    except UpstreamBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except UpstreamUnavailableError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    except SpotifyAPIError as e:
+        if e.status_code == 429:
+            # Pass Spotify's rate limit through so clients back off too
+            raise HTTPException(status_code=429, detail=e.message, headers={"Retry-After": e.headers.get("Retry-After", "1")})
+        raise
 
 
 @app.get("/access_token")
-def access_token():
+async def access_token():
     """Provide the Spotify access token for Web Playback SDK."""
-    global ACCESS_TOKEN, REFRESH_TOKEN
     try:
         # Refresh the access token if needed
-        refresh_access_token_if_needed()
-        if not ACCESS_TOKEN:
+        token = await get_access_token()
+        if not token:
             raise HTTPException(status_code=500, detail="Access token is unavailable.")
-        return {"token": ACCESS_TOKEN}
+        return {"token": token, "expires_at": token_manager.expiry_time.timestamp()}
     except Exception as e:
         print(f"Error in /access_token: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve access token.")
@@ -90,109 +136,175 @@ def login():
     return {"auth_url": auth_url}
 
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-        self.lock = Lock()
-
-    async def connect(self, websocket: WebSocket):
-        async with self.lock:
-            await websocket.accept()
-            self.active_connections.append(websocket)
-
-    async def disconnect(self, websocket: WebSocket):
-        async with self.lock:
-            self.active_connections.remove(websocket)
-
-    async def send_message(self, message: str):
-        async with self.lock:
-            for connection in self.active_connections:
-                await connection.send_text(message)
-
-manager = ConnectionManager()
-
 # Callback updates tokens and sends them via WebSocket
 @app.get("/callback")
 async def callback(code: str):
     try:
-        tokens = get_tokens(code)
-        update_env(tokens)
-        set_token_expiry(tokens['expires_in'])
-        # Notify clients to reload environment variables
-        await manager.send_message("reload_env")  # Use await for async calls
+        tokens = await asyncio.to_thread(get_tokens, code)
+        token_manager.set_tokens(tokens)
+        on_token_refresh(tokens)
         return {"message": "Tokens updated and notification sent"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     
 @app.post("/refresh")
-def refresh_token_endpoint(request: Request):
-    if not is_token_expired():
-        return {"message": "Token is still valid"} 
+async def refresh_token_endpoint(request: Request, force: bool = False):
+    """Refresh the access token if it has expired, or unconditionally with ?force=1 (e.g. Spotify revoked it)."""
+    if not force and not token_manager.is_expired():
+        return {"message": "Token is still valid"}
     try:
-        tokens = refresh_token(REFRESH_TOKEN)
-        update_env(tokens)  # Saves tokens to .user
-        set_token_expiry(tokens['expires_in'])
+        tokens = await token_manager.refresh()  # Saved to .user in the background
         return tokens
     except Exception as e:
-        return RedirectResponse(url=f"/error?message={str(e)}")
+        # An error status, not a redirect: requests follows redirects and would report success
+        print(f"Error refreshing token: {e}")
+        raise HTTPException(status_code=502, detail=f"Token refresh failed: {e}")
     
 # --- Playback Routes ---
+async def get_devices(fresh=False):
+    """Return the user's devices, from the cache unless it is stale or `fresh` is set."""
+    async def fetch():
+        devices = await call_spotify(app.state.spotify.devices)
+        return devices["devices"]
+    return await device_cache.get(fetch, fresh=fresh)
+
+async def choose_device():
+    """Pick the device to start playback on."""
+    return device_cache.choose_device(await get_devices())
+
 @app.get("/devices")
-def list_devices():
-    """List all Spotify playback devices."""
+async def list_devices(fresh: bool = False):
+    """List all Spotify playback devices (pass ?fresh=1 to bypass the cache)."""
     try:
-        sp = get_spotify_client()
-        devices = sp.devices()
-        return {"devices": devices["devices"]}
-    except SpotifyException as e:
+        devices = await get_devices(fresh=fresh)
+        return {"devices": devices}
+    except SpotifyAPIError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/play")
-def play_song(song_uri: str = None):
+async def play_song(song_uri: str = None):
     """Start or resume playback."""
     try:
-        sp = get_spotify_client()
+        device_id = await choose_device()
         if song_uri:
-            sp.start_playback(uris=[song_uri])
+            await call_spotify(app.state.spotify.start_playback, uris=[song_uri], device_id=device_id)
         else:
-            sp.start_playback()
+            await call_spotify(app.state.spotify.start_playback, device_id=device_id)
+        device_cache.mark_active(device_id)
+        manager.publish(PLAYER_STATE, {"is_playing": True, "song_uri": song_uri})
         return {"message": "Playback started"}
-    except SpotifyException as e:
+    except SpotifyAPIError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class QueueRequest(BaseModel):
+    uris: list[str] = []  # Track URIs, open.spotify.com track URLs or song names
+    use_preferences: bool = False  # Append the boost list from user_preferences.json
+    shuffle: Optional[bool] = None
+    repeat: Optional[str] = None  # "track", "context" or "off"
+    offset: int = 0  # Index of the track to start from
+    position_ms: Optional[int] = None  # Position within that track
+    device_id: Optional[str] = None
+
+@app.post("/queue")
+async def play_batch(queue: QueueRequest):
+    """Start playback of a whole list of tracks in one request."""
+    if queue.repeat not in (None, "track", "context", "off"):
+        raise HTTPException(status_code=400, detail="Repeat must be 'track', 'context' or 'off'.")
+    try:
+        entries = list(queue.uris)
+        if queue.use_preferences:
+            entries += await asyncio.to_thread(load_preference_entries)
+        uris = await call_spotify(partial(resolve_uris, app.state.spotify), entries)
+        if not uris:
+            raise HTTPException(status_code=400, detail="No playable tracks in the request.")
+        if not (0 <= queue.offset < len(uris)):
+            raise HTTPException(status_code=400, detail="Offset is outside the list of tracks.")
+
+        device_id = queue.device_id or await choose_device()
+        calls = await call_spotify(
+            partial(play_queue, app.state.spotify), uris=uris, offset=queue.offset, position_ms=queue.position_ms,
+            shuffle=queue.shuffle, repeat=queue.repeat, device_id=device_id,
+        )
+        device_cache.mark_active(device_id)
+        manager.publish(PLAYER_STATE, {"is_playing": True, "queue_length": len(uris)})
+        return {"message": "Queue started", "tracks": len(uris), "upstream_calls": calls}
+    except FileNotFoundError:
+        raise HTTPException(status_code=400, detail="Preferences file not found.")
+    except SpotifyAPIError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/pause")
-def pause_playback():
+async def pause_playback():
     """Pause current playback."""
     try:
-        sp = get_spotify_client()
-        sp.pause_playback()
+        await call_spotify(app.state.spotify.pause_playback)
+        manager.publish(PLAYER_STATE, {"is_playing": False})
         return {"message": "Playback paused"}
-    except SpotifyException as e:
+    except SpotifyAPIError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/volume")
-def set_volume(volume_percent: int):
+async def set_volume(volume_percent: int):
     """Set playback volume (0-100)."""
     try:
         if not (0 <= volume_percent <= 100):
             raise HTTPException(status_code=400, detail="Volume must be between 0 and 100.")
-        sp = get_spotify_client()
-        sp.volume(volume_percent)
+        await call_spotify(app.state.spotify.volume, volume_percent)
+        manager.publish(PLAYER_STATE, {"volume_percent": volume_percent})
         return {"message": f"Volume set to {volume_percent}%"}
-    except SpotifyException as e:
+    except SpotifyAPIError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
+@app.post("/schedule")
+async def schedule_changed(request: Request):
+    """Broadcast a saved playback schedule to the other connected clients."""
+    schedule = await request.json()
+    # The posting client already has the schedule; its X-Client-Id keeps the event from echoing back
+    manager.publish(SCHEDULE_CHANGE, schedule, exclude_client=request.headers.get("X-Client-Id"))
+    return {"message": "Schedule change sent"}
+
+class SDKEvent(BaseModel):
+    event: str  # "ready" or "not_ready"
+    device_id: str
+
+@app.post("/sdk-events")
+async def sdk_event(sdk_event: SDKEvent):
+    """Invalidate cached devices when the Web Playback SDK player comes online or goes offline."""
+    if sdk_event.event == "ready":
+        device_cache.sdk_ready(sdk_event.device_id)
+    elif sdk_event.event == "not_ready":
+        device_cache.sdk_not_ready(sdk_event.device_id)
+    else:
+        raise HTTPException(status_code=400, detail="Event must be 'ready' or 'not_ready'.")
+    return {"message": "Device cache updated"}
+
 @app.get("/error")
 def error(request: Request):
     error_message = request.query_params.get("message", "An error occurred")
     return {"message": error_message}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Expose backend metrics in the Prometheus text format."""
+    limiter = to_thread.current_default_thread_limiter()
+    THREADPOOL_IN_USE.set(limiter.borrowed_tokens)
+    THREADPOOL_SIZE.set(limiter.total_tokens)
+    THREADPOOL_WAITING.set(limiter.statistics().tasks_waiting)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    await manager.connect(websocket, websocket.query_params.get("client_id"))
     try:
         while True:
-            await websocket.receive_text()
+            # Clients may send {"subscribe": ["token_update", ...]} to pick their topics
+            message = await websocket.receive_text()
+            try:
+                topics = json.loads(message).get("subscribe")
+            except (ValueError, AttributeError):
+                continue
+            if isinstance(topics, list):
+                manager.subscribe(websocket, topics)
     except WebSocketDisconnect:
         print("WebSocket disconnected.")
         await manager.disconnect(websocket)  # Ensure disconnect is awaited
@@ -240,14 +352,25 @@ def sdk_client():
                     console.log(state);
                 });
 
+                // Tell the backend so its device cache stays current
+                const reportDevice = (event, device_id) => {
+                    fetch('/sdk-events', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ event, device_id })
+                    });
+                };
+
                 // Ready
                 player.addListener('ready', ({ device_id }) => {
                     console.log('Ready with Device ID', device_id);
+                    reportDevice('ready', device_id);
                 });
 
                 // Not Ready
                 player.addListener('not_ready', ({ device_id }) => {
                     console.log('Device ID has gone offline', device_id);
+                    reportDevice('not_ready', device_id);
                 });
 
                 // Connect the player
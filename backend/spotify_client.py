@@ -0,0 +1,201 @@
+import asyncio
+import time
+import httpx # type: ignore
+from metrics import Counter, Gauge, Histogram
+from request_scheduler import RequestScheduler, INTERACTIVE, BACKGROUND
+
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+
+try:
+    import h2  # type: ignore # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+UPSTREAM_IN_FLIGHT = Gauge("spotify_upstream_in_flight", "Spotify API calls currently in flight.")
+UPSTREAM_QUEUED = Gauge("spotify_upstream_queued", "Spotify API calls waiting for a concurrency slot.")
+UPSTREAM_QUEUE_WAIT = Histogram("spotify_upstream_queue_wait_seconds", "Time spent waiting for a concurrency slot.")
+UPSTREAM_DURATION = Histogram("spotify_upstream_request_duration_seconds", "Spotify API call latency.", ["method", "endpoint"])
+UPSTREAM_RESPONSES = Counter("spotify_upstream_responses_total", "Spotify API responses by status.", ["endpoint", "status"])
+UPSTREAM_REJECTED = Counter("spotify_upstream_rejected_total", "Spotify API calls rejected because the wait queue was full.")
+
+
+class SpotifyAPIError(Exception):
+    """Raised when the Spotify Web API answers with an error status."""
+
+    def __init__(self, status_code, message, headers=None):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+        self.headers = headers or {}
+
+
+class UpstreamUnavailableError(SpotifyAPIError):
+    """Raised when the Spotify Web API can't be reached or doesn't answer in time (503 or 504)."""
+
+
+class UpstreamBusyError(Exception):
+    """Raised when too many Spotify API calls are already waiting for a slot."""
+
+
+class SpotifyClient:
+    def __init__(self, base_url=SPOTIFY_API_URL, pool_size=20, keepalive_expiry=60, timeout=10,
+                 max_concurrency=10, max_queue=100, scheduler=None, max_retries=2, max_retry_wait=5):
+        """
+        Long-lived, connection-pooled client for the Spotify Web API.
+
+        One instance is shared by every playback route so connections (and
+        their TLS sessions) are reused instead of re-established per request.
+        A semaphore bounds the calls in flight upstream; callers beyond
+        `max_queue` waiters are rejected instead of piling up. Every call also
+        goes through the rate-limit scheduler; a 429 is retried after its
+        Retry-After when the wait is short, and raised otherwise. Connection
+        errors and timeouts raise UpstreamUnavailableError.
+
+        Args:
+            base_url (str): Spotify Web API base URL.
+            pool_size (int): Maximum number of pooled connections.
+            keepalive_expiry (int): Seconds an idle connection is kept open.
+            timeout (int): Per-request timeout in seconds.
+            max_concurrency (int): Maximum number of upstream calls in flight (at most `pool_size`).
+            max_queue (int): Maximum number of calls waiting for a slot (None for unbounded).
+            scheduler (RequestScheduler): Shared rate limiter (a default one is created if omitted).
+            max_retries (int): Retries of a call answered with 429.
+            max_retry_wait (int): Longest Retry-After, in seconds, worth waiting for.
+        """
+        self.base_url = base_url.rstrip("/")
+        # Calls wait for the semaphore, never for a pooled connection, so a queued call
+        # can't run out its timeout in httpx's pool (a PoolTimeout still maps to 504)
+        self.max_concurrency = min(max_concurrency, pool_size)
+        self.max_queue = max_queue
+        self.scheduler = scheduler or RequestScheduler()
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._waiting = 0
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=timeout,
+        )
+
+    async def request(self, method, path, access_token, params=None, json=None, priority=BACKGROUND):
+        """Send an authorized request and return the decoded JSON body (or None)."""
+        for _ in range(self.max_retries + 1):
+            await self.scheduler.acquire(priority)
+            response = await self._send(method, path, access_token, params, json)
+            if response.status_code != 429:
+                break
+            retry_after = int(response.headers.get("Retry-After", "1"))
+            self.scheduler.retry_after(retry_after)
+            if retry_after > self.max_retry_wait:
+                break
+
+        if response.status_code >= 400:
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = response.text or response.reason_phrase
+            raise SpotifyAPIError(response.status_code, message, response.headers)
+        if response.status_code == 204 or not response.content:
+            return None
+        return response.json()
+
+    async def _send(self, method, path, access_token, params, json):
+        if self.max_queue is not None and self._semaphore.locked() and self._waiting >= self.max_queue:
+            UPSTREAM_REJECTED.inc()
+            raise UpstreamBusyError("Too many pending Spotify requests.")
+
+        self._waiting += 1
+        UPSTREAM_QUEUED.inc()
+        queued_at = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+            UPSTREAM_QUEUED.dec()
+        UPSTREAM_QUEUE_WAIT.observe(time.perf_counter() - queued_at)
+
+        UPSTREAM_IN_FLIGHT.inc()
+        started_at = time.perf_counter()
+        try:
+            headers = {"Authorization": f"Bearer {access_token}"}
+            response = await self._client.request(method, path, headers=headers, params=params, json=json)
+        except httpx.TransportError as e:
+            UPSTREAM_RESPONSES.inc(endpoint=path, status="error")
+            # Connection failures and timeouts reach the routes as API errors, not unhandled 500s
+            status_code = 504 if isinstance(e, httpx.TimeoutException) else 503
+            raise UpstreamUnavailableError(status_code, f"Spotify API unavailable ({type(e).__name__})") from e
+        except httpx.HTTPError:
+            UPSTREAM_RESPONSES.inc(endpoint=path, status="error")
+            raise
+        finally:
+            UPSTREAM_DURATION.observe(time.perf_counter() - started_at, method=method, endpoint=path)
+            UPSTREAM_IN_FLIGHT.dec()
+            self._semaphore.release()
+        UPSTREAM_RESPONSES.inc(endpoint=path, status=response.status_code)
+        return response
+
+    async def devices(self, access_token):
+        """List the user's available playback devices."""
+        return await self.request("GET", "/me/player/devices", access_token)
+
+    async def start_playback(self, access_token, uris=None, offset=None, position_ms=None, device_id=None):
+        """Start or resume playback, optionally with the given track URIs."""
+        body = {}
+        if uris:
+            body["uris"] = uris
+        if offset is not None:
+            body["offset"] = {"position": offset}
+        if position_ms is not None:
+            body["position_ms"] = position_ms
+        params = {"device_id": device_id} if device_id else None
+        return await self.request(
+            "PUT", "/me/player/play", access_token, params=params, json=body or None, priority=INTERACTIVE
+        )
+
+    async def add_to_queue(self, access_token, uri, device_id=None):
+        """Append a track to the end of the playback queue."""
+        params = {"uri": uri}
+        if device_id:
+            params["device_id"] = device_id
+        return await self.request("POST", "/me/player/queue", access_token, params=params, priority=INTERACTIVE)
+
+    async def shuffle(self, access_token, state, device_id=None):
+        """Turn shuffle on or off."""
+        params = {"state": "true" if state else "false"}
+        if device_id:
+            params["device_id"] = device_id
+        return await self.request("PUT", "/me/player/shuffle", access_token, params=params, priority=INTERACTIVE)
+
+    async def repeat(self, access_token, state, device_id=None):
+        """Set the repeat mode: "track", "context" or "off"."""
+        params = {"state": state}
+        if device_id:
+            params["device_id"] = device_id
+        return await self.request("PUT", "/me/player/repeat", access_token, params=params, priority=INTERACTIVE)
+
+    async def search_track(self, access_token, query):
+        """Return the URI of the best track match for `query`, or None."""
+        result = await self.request("GET", "/search", access_token, params={"q": query, "type": "track", "limit": 1})
+        items = result["tracks"]["items"] if result else []
+        return items[0]["uri"] if items else None
+
+    async def pause_playback(self, access_token):
+        """Pause playback on the active device."""
+        return await self.request("PUT", "/me/player/pause", access_token, priority=INTERACTIVE)
+
+    async def volume(self, access_token, volume_percent):
+        """Set the volume of the active device."""
+        return await self.request(
+            "PUT", "/me/player/volume", access_token, params={"volume_percent": volume_percent}, priority=INTERACTIVE
+        )
+
+    async def aclose(self):
+        """Close all pooled connections."""
+        await self._client.aclose()
@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+import time
+from auth import refresh_token
+from metrics import Counter, Histogram
+
+TOKEN_REFRESHES = Counter("token_refreshes_total", "Access token refreshes by result.", ["result"])
+TOKEN_REFRESH_DURATION = Histogram("token_refresh_duration_seconds", "Time taken to refresh the access token.")
+
+
+class TokenManager:
+    def __init__(self, access_token=None, refresh_token=None, expiry_time=None, refresh_margin=300, retry_interval=30,
+                 on_refresh=None):
+        """
+        Own the Spotify tokens and keep the access token fresh for every route.
+
+        Concurrent callers that find the token expired share one in-flight
+        refresh, and a background task refreshes ahead of expiry so routes
+        rarely have to wait at all.
+
+        Args:
+            access_token (str): Access token loaded at startup, if any.
+            refresh_token (str): Refresh token loaded at startup, if any.
+            expiry_time (datetime): Expiry of `access_token`, if known.
+            refresh_margin (int): Seconds before expiry to refresh proactively.
+            retry_interval (int): Seconds to wait before retrying a failed background refresh.
+            on_refresh (callable): Called with the new token dict after each refresh.
+        """
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expiry_time = expiry_time  # None means unknown, so the first use refreshes
+        self.lifetime = None  # Seconds the current token was issued for
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.on_refresh = on_refresh
+
+        self._inflight = None
+        self._changed = asyncio.Event()
+        self._background_task = None
+
+    def is_expired(self, margin=0):
+        """Check whether the access token is expired (or will be within `margin` seconds)."""
+        if self.expiry_time is None:
+            return True
+        return datetime.now() + timedelta(seconds=margin) >= self.expiry_time
+
+    def set_tokens(self, tokens):
+        """Store a token dict from Spotify and reschedule the background refresh."""
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens.get("refresh_token") or self.refresh_token
+        self.lifetime = int(tokens["expires_in"])
+        self.expiry_time = datetime.now() + timedelta(seconds=self.lifetime)
+        self._changed.set()
+
+    async def get_token(self):
+        """Return a valid access token, refreshing it first if it has expired."""
+        if self.is_expired():
+            await self.refresh()
+        return self.access_token
+
+    async def refresh(self):
+        """Refresh the access token, joining the in-flight refresh if there is one."""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+            self._inflight.add_done_callback(self._clear_inflight)
+        # Shield so a cancelled caller does not cancel the refresh for everyone else
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, future):
+        self._inflight = None
+
+    async def _refresh(self):
+        if not self.refresh_token:
+            raise Exception("Refresh token not available. Please log in.")
+        print("Refreshing access token...")
+        started_at = time.perf_counter()
+        try:
+            tokens = await asyncio.to_thread(refresh_token, self.refresh_token)
+        except Exception:
+            TOKEN_REFRESHES.inc(result="error")
+            raise
+        finally:
+            TOKEN_REFRESH_DURATION.observe(time.perf_counter() - started_at)
+        TOKEN_REFRESHES.inc(result="success")
+        self.set_tokens(tokens)
+        if self.on_refresh:
+            self.on_refresh(tokens)
+        return tokens
+
+    async def _refresh_loop(self):
+        """Refresh the token `refresh_margin` seconds before it expires."""
+        while True:
+            self._changed.clear()
+            if not self.refresh_token:
+                timeout = None  # Nothing to refresh until someone logs in
+            elif self.expiry_time is None:
+                timeout = 0
+            else:
+                # Never refresh earlier than halfway through a short-lived token
+                margin = min(self.refresh_margin, self.lifetime / 2) if self.lifetime else self.refresh_margin
+                refresh_at = self.expiry_time - timedelta(seconds=margin)
+                timeout = max((refresh_at - datetime.now()).total_seconds(), 0)
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+                continue  # Tokens changed, recompute the schedule
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Background token refresh failed: {e}")
+                await asyncio.sleep(self.retry_interval)
+
+    def start(self):
+        """Start the background refresh task on the running event loop."""
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        """Stop the background refresh task."""
+        if self._background_task is not None:
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+            self._background_task = None
@@ -0,0 +1,99 @@
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from dotenv import dotenv_values
+
+
+class TokenStore:
+    def __init__(self, path, flush_delay=0.5):
+        """
+        In-memory token store with write-behind persistence to the .user file.
+
+        Reads never touch the disk. Updates are coalesced and written off the
+        event loop with a temp file, fsync and atomic rename, so a crash or an
+        overlapping refresh can never leave a torn file behind.
+
+        Args:
+            path (str): Path of the dotenv-style token file.
+            flush_delay (float): Seconds to wait for further updates before writing.
+        """
+        self.path = Path(path)
+        self.flush_delay = flush_delay
+        self._tokens = {}
+        self._version = 0
+        self._written_version = 0
+        self._flush_task = None
+        self._write_lock = asyncio.Lock()
+
+    def load(self):
+        """Load tokens persisted by a previous run."""
+        values = dotenv_values(self.path) if self.path.exists() else {}
+        self._tokens = {
+            "access_token": values.get("ACCESS_TOKEN"),
+            "refresh_token": values.get("REFRESH_TOKEN"),
+            "expires_in": values.get("EXPIRES_IN"),
+            "expires_at": float(values["EXPIRES_AT"]) if values.get("EXPIRES_AT") else None,
+        }
+        return self.get()
+
+    def get(self):
+        """Return a copy of the current tokens."""
+        return dict(self._tokens)
+
+    def update(self, tokens):
+        """Replace the tokens in memory and schedule a write to disk."""
+        self._tokens = {
+            "access_token": tokens["access_token"],
+            "refresh_token": tokens.get("refresh_token") or self._tokens.get("refresh_token"),
+            "expires_in": tokens["expires_in"],
+            "expires_at": tokens.get("expires_at") or time.time() + int(tokens["expires_in"]),
+        }
+        self._version += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        while self._written_version != self._version:
+            await asyncio.sleep(self.flush_delay)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error updating tokens: {e}")
+                return
+
+    async def flush(self):
+        """Write the latest tokens to disk if they changed since the last write."""
+        async with self._write_lock:
+            if self._written_version == self._version:
+                return
+            version, tokens = self._version, self.get()
+            await asyncio.to_thread(self._write, tokens)
+            self._written_version = version
+
+    def _write(self, tokens):
+        lines = [
+            f"ACCESS_TOKEN={tokens['access_token']}\n",
+            f"REFRESH_TOKEN={tokens['refresh_token']}\n",
+            f"EXPIRES_IN={tokens['expires_in']}\n",
+            f"EXPIRES_AT={tokens['expires_at']}\n",
+        ]
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".user.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # Persist the rename itself; directories can't be opened on Windows
+        if hasattr(os, "O_DIRECTORY"):
+            dir_fd = os.open(self.path.parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)